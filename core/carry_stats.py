@@ -0,0 +1,243 @@
+"""Скользящая статистика кэрри по каждому контракту и спреду.
+
+Для каждого ключа (SHORTNAME_futures или Name_spread) хранится среднее и
+дисперсия по Уэлфорду и P²-гистограмма (Jain & Chlamtac) с фиксированным
+числом маркеров. Обновление — O(1) на снимок, без чтения истории из spread.db.
+"""
+import json
+import logging
+import math
+import os
+
+from core.files import write_atomic
+
+# Число ячеек P²-гистограммы (маркеров на один больше)
+SKETCH_CELLS = 20
+# Минимум наблюдений, после которого z-оценка и перцентиль считаются надёжными
+MIN_OBSERVATIONS = 20
+# Через сколько снимков без ключа (истёкший контракт) его статистика удаляется
+MAX_MISSED_SNAPSHOTS = 60
+
+
+class Welford:
+    """Инкрементальные среднее и дисперсия."""
+
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def update(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def zscore(self, value):
+        std = self.std
+        return (value - self.mean) / std if std > 0 else 0.0
+
+
+class P2Histogram:
+    """Потоковая оценка распределения: маркеры на квантилях 0, 1/b, ..., 1."""
+
+    __slots__ = ("cells", "heights", "positions", "count")
+
+    def __init__(self, cells=SKETCH_CELLS, heights=None, positions=None, count=0):
+        self.cells = cells
+        self.heights = heights or []
+        self.positions = positions or []
+        self.count = count
+
+    def update(self, value):
+        self.count += 1
+        q, n, b = self.heights, self.positions, self.cells
+
+        # Пока наблюдений не больше числа маркеров — храним их отсортированными
+        if self.count <= b + 1:
+            q.append(value)
+            q.sort()
+            n[:] = list(range(1, len(q) + 1))
+            return
+
+        if value < q[0]:
+            q[0] = value
+            k = 0
+        elif value >= q[b]:
+            q[b] = value
+            k = b - 1
+        else:
+            k = next(i for i in range(b) if q[i] <= value < q[i + 1])
+        for i in range(k + 1, b + 1):
+            n[i] += 1
+
+        for i in range(1, b):
+            desired = 1 + i * (self.count - 1) / b
+            d = desired - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = self._parabolic(i, d)
+                if q[i - 1] < candidate < q[i + 1]:
+                    q[i] = candidate
+                else:
+                    q[i] += d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def percentile(self, value):
+        """Доля наблюдений не больше value (0..1), линейная интерполяция между маркерами."""
+        q = self.heights
+        if not q:
+            return None
+        if value < q[0]:
+            return 0.0
+        if value >= q[-1]:
+            return 1.0
+        steps = len(q) - 1
+        for i in range(steps):
+            if q[i] <= value < q[i + 1]:
+                width = q[i + 1] - q[i]
+                return (i + ((value - q[i]) / width if width else 0.0)) / steps
+        return 1.0
+
+
+class CarryStat:
+    """Статистика одного контракта или спреда."""
+
+    __slots__ = ("moments", "sketch", "last_systime", "last_seen")
+
+    def __init__(self, moments=None, sketch=None, last_systime=None, last_seen=0):
+        self.moments = moments or Welford()
+        self.sketch = sketch or P2Histogram()
+        self.last_systime = last_systime
+        # Номер последнего снимка, в котором встречался ключ
+        self.last_seen = last_seen
+
+    def has_seen(self, systime):
+        """Снимок уже учтён: повторный запуск с тем же SYSTIME или более старый снимок."""
+        return systime is not None and self.last_systime is not None and systime <= self.last_systime
+
+    def update(self, value, systime):
+        # Один снимок учитывается один раз, даже при повторном запуске
+        if self.has_seen(systime):
+            return
+        self.moments.update(value)
+        self.sketch.update(value)
+        self.last_systime = systime
+
+    def to_dict(self):
+        return {
+            "count": self.moments.count,
+            "mean": self.moments.mean,
+            "m2": self.moments.m2,
+            "cells": self.sketch.cells,
+            "heights": self.sketch.heights,
+            "positions": self.sketch.positions,
+            "sketch_count": self.sketch.count,
+            "last_systime": self.last_systime,
+            "last_seen": self.last_seen,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            Welford(data["count"], data["mean"], data["m2"]),
+            P2Histogram(data["cells"], data["heights"], data["positions"], data["sketch_count"]),
+            data.get("last_systime"),
+            data.get("last_seen", 0),
+        )
+
+
+class CarryStats:
+    """Набор статистик по ключам с сохранением в JSON между перезапусками."""
+
+    def __init__(self, path="data/carry_stats.json", min_observations=MIN_OBSERVATIONS,
+                 max_missed=MAX_MISSED_SNAPSHOTS):
+        self.path = path
+        self.min_observations = min_observations
+        self.max_missed = max_missed
+        self.stats = {}
+        # Счётчик снимков и SYSTIME последнего из них
+        self.snapshots = 0
+        self.last_systime = None
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path, "r") as file:
+                data = json.load(file)
+            if "stats" not in data:
+                # Прежний формат: только статистики по ключам
+                data = {"stats": data}
+            self.snapshots = data.get("snapshots", 0)
+            self.last_systime = data.get("last_systime")
+            self.stats = {key: CarryStat.from_dict(value) for key, value in data["stats"].items()}
+            if "snapshots" not in data:
+                for stat in self.stats.values():
+                    stat.last_seen = self.snapshots
+            logging.info(f"Статистика кэрри загружена: {len(self.stats)} ключей.")
+        except Exception as e:
+            logging.error(f"Ошибка при чтении статистики кэрри {self.path}: {e}")
+        return self
+
+    def prune(self):
+        """Удаление ключей, которых не было max_missed снимков (истёкшие контракты)."""
+        expired = [key for key, stat in self.stats.items() if self.snapshots - stat.last_seen > self.max_missed]
+        for key in expired:
+            del self.stats[key]
+        if expired:
+            logging.info(f"Удалена статистика истёкших контрактов и спредов: {len(expired)}.")
+        return expired
+
+    def save(self):
+        self.prune()
+        data = {
+            "snapshots": self.snapshots,
+            "last_systime": self.last_systime,
+            "stats": {key: stat.to_dict() for key, stat in self.stats.items()},
+        }
+        write_atomic(self.path, lambda file: json.dump(data, file))
+
+    def score(self, key, value):
+        """z-оценка и перцентиль значения относительно истории ключа или (None, None)."""
+        stat = self.stats.get(key)
+        if stat is None or stat.moments.count < self.min_observations:
+            return None, None
+        return stat.moments.zscore(value), stat.sketch.percentile(value)
+
+    def observe(self, pairs, systime):
+        """Оценка значений снимка по истории и последующее обновление статистики.
+
+        pairs — пары (ключ, значение); возвращает {ключ: (z, перцентиль)}.
+        Уже учтённый снимок (тот же SYSTIME) не оценивается: история содержит его значения.
+        """
+        if systime is None or systime != self.last_systime:
+            self.snapshots += 1
+            self.last_systime = systime
+
+        scores = {}
+        for key, value in pairs:
+            stat = self.stats.get(key)
+            if stat is not None:
+                stat.last_seen = self.snapshots
+            if value is None or not math.isfinite(value):
+                continue
+            if stat is not None and stat.has_seen(systime):
+                continue
+            scores[key] = self.score(key, value)
+            stat = self.stats.setdefault(key, CarryStat(last_seen=self.snapshots))
+            stat.update(value, systime)
+        return scores
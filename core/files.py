@@ -0,0 +1,13 @@
+import os
+
+
+def write_atomic(path, dump, binary=False):
+    """Запись файла через временный файл и os.replace: читатели не видят недописанный файл.
+
+    dump(file) пишет содержимое в открытый временный файл.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb" if binary else "w") as file:
+        dump(file)
+    os.replace(tmp_path, path)
@@ -0,0 +1,86 @@
+import logging
+import os
+import requests
+
+# Колонки для запросов
+COLUMNS_SEC_FUTURES = "SECID,SHORTNAME,LASTDELDATE,SECTYPE,ASSETCODE,PREVOPENPOSITION,LOTVOLUME,INITIALMARGIN,TIME"
+COLUMNS_MD_FUTURES = "SYSTIME,SECID,SPREAD,LAST,OPENPOSITION,NUMTRADES,TIME"
+COLUMNS_SEC_SHARES = "SECID,SHORTNAME,LOTSIZE"
+COLUMNS_MD_SHARES = "SECID,BID,OFFER,SPREAD,LAST,TIME,SYSTIME"
+
+# Словарь замен
+replacements = {
+    "BELUGA": "BELU",
+    "ISKJ": "ABIO",
+    "GAZR": "GAZP",
+    "MTSI": "MTSS",
+    "NOTK": "NVTK",
+    "SBRF": "SBER",
+    "SBPR": "SBERP",
+    "SNGR": "SNGS",
+    "SNGP": "SNGSP",
+    "TRNF": "TRNFP",
+    "TATP": "TATNP",
+}
+
+
+def read_secids(path="secid.txt"):
+    """Чтение списка SECID фьючерсов из файла."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Файл {path} не найден.")
+    with open(path, "r") as file:
+        secids = file.read().strip().split(",")
+    if not secids or all(not secid.strip() for secid in secids):
+        raise ValueError(f"Файл {path} пуст или содержит некорректные данные.")
+
+    logging.info(f"Список SECID из {path}: {secids}")
+    return secids
+
+
+def futures_url(secids):
+    """URL запроса фьючерсов к ISS."""
+    return (
+        f"https://iss.moex.com/iss/engines/futures/markets/forts/boards/rfud/securities.csv"
+        f"?securities={','.join(secids)}"
+        "&iss.only=securities,marketdata"
+        f"&securities.columns={COLUMNS_SEC_FUTURES}"
+        f"&marketdata.columns={COLUMNS_MD_FUTURES}"
+    )
+
+
+def shares_url(set_asset):
+    """URL запроса акций к ISS."""
+    return (
+        f"https://iss.moex.com/iss/engines/stock/markets/shares/boards/TQBR/securities.csv"
+        f"?securities={','.join(set_asset)}"
+        "&iss.only=securities,marketdata"
+        f"&securities.columns={COLUMNS_SEC_SHARES}"
+        f"&marketdata.columns={COLUMNS_MD_SHARES}"
+    )
+
+
+def fetch_iss_csv(url, temp_path, what):
+    """Загрузка CSV из ISS с сохранением во временный файл, возвращает текст ответа."""
+    response = requests.get(url)
+    if response.status_code != 200:
+        raise ConnectionError(f"Ошибка при загрузке данных по {what}: {response.status_code}")
+    with open(temp_path, "wb") as file:
+        file.write(response.content)
+
+    logging.info(f"Данные по {what} успешно загружены.")
+
+    with open(temp_path, "r") as file:
+        return file.read()
+
+
+def split_iss_tables(data, name):
+    """Разделение ответа ISS на тексты таблиц securities и marketdata."""
+    parts = data.split("marketdata")
+    if len(parts) < 2:
+        raise ValueError(f"Некорректный формат данных в файле {name}.csv.")
+
+    # Первая таблица (securities) и вторая таблица (marketdata)
+    securities_data = parts[0].strip()
+    securities_data = securities_data.replace("securities", "").strip()
+    marketdata_data = parts[1].strip()
+    return securities_data, marketdata_data
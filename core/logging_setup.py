@@ -0,0 +1,114 @@
+import atexit
+import logging
+import os
+import queue
+import time
+from collections import defaultdict
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = "%(asctime)s - [%(levelname)s]: %(message)s"
+DATE_FORMAT = "%d.%m.%Y %H:%M:%S"
+
+
+class StructuredFormatter(logging.Formatter):
+    """Формат как раньше плюс поля из extra={"fields": {...}} в виде key=value."""
+
+    def format(self, record):
+        message = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            message += " | " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return message
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler, который не форматирует сообщение в вызывающем потоке.
+
+    Форматирование (в том числе str() больших DataFrame) выполняется в потоке
+    QueueListener. Трассировка исключения превращается в текст сразу, пока
+    кадры стека ещё живы.
+    """
+
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """Не чаще одной записи за interval секунд для записей с одинаковым extra={"key": ...}."""
+
+    def __init__(self, interval=60.0):
+        super().__init__()
+        self.interval = interval
+        self._last = {}
+        self._suppressed = defaultdict(int)
+
+    def filter(self, record):
+        key = getattr(record, "key", None)
+        if key is None:
+            return True
+        now = time.monotonic()
+        if now - self._last.get(key, -self.interval) < self.interval:
+            self._suppressed[key] += 1
+            return False
+        self._last[key] = now
+        suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record.fields = {**(getattr(record, "fields", None) or {}), "suppressed": suppressed}
+        return True
+
+
+class SkipSummary:
+    """Сбор повторяющихся предупреждений о пропусках в одну сводку за запуск."""
+
+    def __init__(self, title, max_names=10):
+        self.title = title
+        self.max_names = max_names
+        self.reasons = defaultdict(list)
+
+    def add(self, reason, name):
+        self.reasons[reason].append(name)
+
+    def log(self):
+        if not self.reasons:
+            return
+        parts = []
+        for reason, names in self.reasons.items():
+            shown = ", ".join(names[:self.max_names])
+            more = f" и ещё {len(names) - self.max_names}" if len(names) > self.max_names else ""
+            parts.append(f"{reason} — {len(names)}: {shown}{more}")
+        logging.warning(
+            f"{self.title}: " + "; ".join(parts),
+            extra={"fields": {"skipped": sum(len(names) for names in self.reasons.values())}},
+        )
+
+
+def setup_logging(path="data/log.log", level=logging.INFO, max_bytes=5 * 1024 * 1024, backup_count=5):
+    """Неблокирующее логирование: очередь в вызывающем потоке, запись на диск в фоновом.
+
+    Ротация RotatingFileHandler безопасна только в одном процессе, поэтому у каждой
+    точки входа (бот, get_kerry.py, export_history.py) свой файл лога.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    formatter = StructuredFormatter(LOG_FORMAT, datefmt=DATE_FORMAT)
+
+    file_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter())
+
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
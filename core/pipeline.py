@@ -0,0 +1,328 @@
+"""Единый конвейер снимка для CLI (get_kerry.py) и бота.
+
+Этапы fetch → parse → total → spread → persist → notify. Результаты этапов
+кэшируются в data/cache/<SYSTIME>/, поэтому повторный запуск того же снимка
+(или отдельного этапа) не повторяет уже выполненную работу, а persist не
+выполняется для снимка дважды. На этапе notify publish вызывается при каждом
+запуске, а notify — при каждом запуске или, с notify_once, один раз на снимок.
+"""
+import asyncio
+import cProfile
+import inspect
+import io
+import logging
+import os
+import pickle
+import pstats
+import re
+import shutil
+import tracemalloc
+from datetime import datetime
+
+from core.files import write_atomic
+from core.iss import fetch_iss_csv, futures_url, read_secids, shares_url
+from core import snapshot
+
+STAGES = ("fetch", "parse", "total", "spread", "persist", "notify")
+# Этапы, результат которых зависит от представления снимка (light или pandas)
+MODE_STAGES = ("parse", "total", "spread")
+# Что этап кладёт в контекст
+OUTPUTS = {
+    "fetch": ("raw",),
+    "parse": ("futures", "shares"),
+    "total": ("total",),
+    "spread": ("spread",),
+    "persist": (),
+    "notify": (),
+}
+
+
+class PipelineError(Exception):
+    """Ошибка выполнения этапа конвейера."""
+
+
+def fetch_stage(ctx, mode):
+    """Загрузка сырых CSV из ISS: сначала фьючерсы, затем акции по их ASSETCODE."""
+    logging.info("Начало загрузки данных по фьючерсам.")
+    futures_data = fetch_iss_csv(futures_url(read_secids()), "temp_futures.csv", "фьючерсам")
+    set_asset = {row.ASSETCODE for row in snapshot.parse_futures(futures_data)}
+
+    logging.info("Начало загрузки данных по акциям.")
+    shares_data = fetch_iss_csv(shares_url(set_asset), "temp_shares.csv", "акциям")
+    return {"raw": {"futures": futures_data, "shares": shares_data}}
+
+
+def parse_stage(ctx, mode):
+    raw = ctx["raw"]
+    if mode == "pandas":
+        from core.data_loader import parse_futures_data, parse_shares_data
+
+        return {"futures": parse_futures_data(raw["futures"]), "shares": parse_shares_data(raw["shares"])}
+    return {"futures": snapshot.parse_futures(raw["futures"]), "shares": snapshot.parse_shares(raw["shares"])}
+
+
+def total_stage(ctx, mode):
+    if mode == "pandas":
+        from core.data_processor import compute_total
+
+        return {"total": compute_total(ctx["futures"], ctx["shares"])}
+    return {"total": snapshot.compute_total(ctx["futures"], ctx["shares"])}
+
+
+def spread_stage(ctx, mode):
+    if mode == "pandas":
+        from core.data_processor import compute_spread
+
+        return {"spread": compute_spread(ctx["total"])}
+    return {"spread": snapshot.compute_spread(ctx["total"])}
+
+
+def persist_stage(ctx, mode):
+    """Сохранение futures, total и spread в CSV и data/spread.db."""
+    if mode == "pandas":
+        from core.data_processor import save_dataframe
+
+        save_dataframe(ctx["futures"], "futures")
+        save_dataframe(ctx["total"], "total")
+        save_dataframe(ctx["spread"], "spread")
+    else:
+        columns, rows, sql_types = snapshot.futures_table(ctx["raw"]["futures"])
+        snapshot.save_table("futures", columns, rows, sql_types)
+        snapshot.save_rows(ctx["total"], "total")
+        snapshot.save_rows(ctx["spread"], "spread")
+    logging.info("Данные по фьючерсам, total и spread сохранены в CSV и SQLite.")
+    return {}
+
+
+STAGE_FUNCTIONS = {
+    "fetch": fetch_stage,
+    "parse": parse_stage,
+    "total": total_stage,
+    "spread": spread_stage,
+    "persist": persist_stage,
+}
+
+
+def snapshot_systime(raw):
+    """SYSTIME снимка из сырого ответа по фьючерсам — ключ кэша этапов."""
+    futures = snapshot.parse_futures(raw["futures"])
+    if not futures or not futures[0].SYSTIME:
+        raise PipelineError("В ответе ISS по фьючерсам нет SYSTIME.")
+    return futures[0].SYSTIME
+
+
+class SnapshotPipeline:
+    """Запуск этапов с кэшем по SYSTIME, пробным режимом и профилированием."""
+
+    def __init__(self, mode="light", notify=None, publish=None, notify_once=False, cache_dir="data/cache",
+                 use_cache=True, dry_run=False, profile_dir=None, keep_snapshots=10):
+        self.mode = mode
+        self.notify = notify
+        self.publish = publish
+        self.notify_once = notify_once
+        self.cache_dir = cache_dir
+        self.use_cache = use_cache
+        self.dry_run = dry_run
+        self.profile_dir = profile_dir
+        self.keep_snapshots = keep_snapshots
+
+    # Кэш этапов
+
+    @staticmethod
+    def _safe(systime):
+        return re.sub(r"[^0-9A-Za-z]+", "-", str(systime)).strip("-")
+
+    def _cache_path(self, systime, stage):
+        suffix = f".{self.mode}" if stage in MODE_STAGES else ""
+        return os.path.join(self.cache_dir, self._safe(systime), f"{stage}{suffix}.pkl")
+
+    def _load(self, systime, stage):
+        path = self._cache_path(systime, stage)
+        if not self.use_cache or systime is None or not os.path.exists(path):
+            return None
+        with open(path, "rb") as file:
+            return pickle.load(file)
+
+    def _store(self, systime, stage, outputs):
+        if not self.use_cache:
+            return
+        write_atomic(
+            self._cache_path(systime, stage),
+            lambda file: pickle.dump(outputs, file, protocol=pickle.HIGHEST_PROTOCOL),
+            binary=True,
+        )
+
+    def _snapshot_dirs(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        dirs = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)]
+        return [d for d in dirs if os.path.isdir(d)]
+
+    def _cached_snapshots(self):
+        """(SYSTIME, каталог) закэшированных снимков по возрастанию SYSTIME, а не времени записи."""
+        snapshots = []
+        for path in self._snapshot_dirs():
+            fetch_path = os.path.join(path, "fetch.pkl")
+            if not os.path.exists(fetch_path):
+                continue
+            try:
+                with open(fetch_path, "rb") as file:
+                    systime = snapshot_systime(pickle.load(file)["raw"])
+                snapshots.append((datetime.fromisoformat(systime), systime, path))
+            except Exception as e:
+                logging.error(f"Не удалось прочитать снимок из кэша {path}: {e}")
+        return [(systime, path) for _, systime, path in sorted(snapshots)]
+
+    def cached_systimes(self):
+        """SYSTIME закэшированных снимков по возрастанию."""
+        return [systime for systime, _ in self._cached_snapshots()]
+
+    def latest_systime(self):
+        """SYSTIME последнего закэшированного снимка."""
+        systimes = self.cached_systimes()
+        return systimes[-1] if systimes else None
+
+    def _prune(self):
+        # Удаляются самые старые по SYSTIME, даже если их кэш недавно перезаписан
+        for _, path in self._cached_snapshots()[:-self.keep_snapshots]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    # Профилирование
+
+    def _run_profiled(self, function, ctx, stage):
+        if not self.profile_dir:
+            return function(ctx, self.mode)
+
+        profiler = cProfile.Profile()
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        profiler.enable()
+        try:
+            return function(ctx, self.mode)
+        finally:
+            profiler.disable()
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            self._write_profile(stage, profiler, after.compare_to(before, "lineno"), peak)
+
+    def _write_profile(self, stage, profiler, memory_diff, peak):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        base = os.path.join(self.profile_dir, stage)
+        profiler.dump_stats(f"{base}.prof")
+
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(25)
+        report.write(f"\ntracemalloc: пик {peak / 1024:.1f} КиБ, крупнейшие приросты памяти:\n")
+        for line in memory_diff[:15]:
+            report.write(f"{line}\n")
+        with open(f"{base}.txt", "w", encoding="utf-8") as file:
+            file.write(report.getvalue())
+        logging.info(f"Профиль этапа {stage} сохранён в {base}.prof/.txt (пик памяти {peak / 1024:.1f} КиБ)")
+
+    # Запуск
+
+    @staticmethod
+    async def _call(callback, ctx):
+        """Вызов обработчика снимка; словарь-результат добавляется в контекст."""
+        result = callback(ctx)
+        if inspect.isawaitable(result):
+            result = await result
+        if isinstance(result, dict):
+            ctx.update(result)
+
+    async def _run_notify(self, ctx, forced):
+        """Этап notify: publish при каждом запуске, notify — с учётом notify_once."""
+        if self.publish is not None:
+            await self._call(self.publish, ctx)
+        if self.notify is None:
+            return
+        if self.notify_once and not forced and self._load(ctx["systime"], "notify") is not None:
+            logging.info(f"Снимок {ctx['systime']} уже разослан, этап notify пропущен.")
+            return
+        await self._call(self.notify, ctx)
+        if self.notify_once and not self.dry_run:
+            self._store(ctx["systime"], "notify", {})
+
+    async def _run_stage(self, stage, ctx):
+        # Блокирующие этапы выполняются в потоке, чтобы не задерживать цикл событий бота
+        return await asyncio.to_thread(self._run_profiled, STAGE_FUNCTIONS[stage], ctx, stage)
+
+    async def run_async(self, stages=None, systime=None, until=None):
+        """Выполнение этапов; stages — этапы, которые нужно выполнить заново.
+
+        Остальные этапы до последнего из stages берутся из кэша, а если их там
+        нет — выполняются. Без stages выполняются все этапы или этапы до until.
+        systime — SYSTIME закэшированного снимка или "latest" вместо загрузки из ISS.
+        """
+        forced = set(stages or ())
+        unknown = forced - set(STAGES)
+        if until is not None and until not in STAGES:
+            unknown.add(until)
+        if unknown:
+            raise PipelineError(f"Неизвестные этапы: {', '.join(sorted(unknown))}")
+        if forced:
+            last = max(STAGES.index(stage) for stage in forced)
+        else:
+            last = STAGES.index(until) if until else len(STAGES) - 1
+
+        # Без загрузки из ISS этапы работают с последним закэшированным снимком
+        if systime is None and forced and "fetch" not in forced:
+            systime = "latest"
+        if systime == "latest":
+            systime = self.latest_systime()
+            if systime is None:
+                raise PipelineError("В кэше нет ни одного снимка.")
+        ctx = {"systime": systime}
+
+        for stage in STAGES[:last + 1]:
+            if self.dry_run and stage == "persist":
+                logging.info(f"Пробный запуск: этап {stage} пропущен.")
+                continue
+            if stage == "notify":
+                # Вывод и рассылка не кэшируются как этап: повтор решает notify_once
+                try:
+                    await self._run_notify(ctx, stage in forced)
+                except Exception as e:
+                    logging.error(f"Произошла ошибка на этапе {stage}: {e}")
+                    raise PipelineError(f"Этап {stage}: {e}") from e
+                continue
+
+            fresh_fetch = stage == "fetch" and systime is None
+            cached = None if stage in forced or fresh_fetch else self._load(ctx["systime"], stage)
+            if cached is not None:
+                logging.info(f"Этап {stage} для снимка {ctx['systime']} взят из кэша.")
+                ctx.update(cached)
+                continue
+            if stage == "fetch" and not fresh_fetch and stage not in forced:
+                raise PipelineError(f"Снимок {ctx['systime']} не найден в кэше.")
+
+            logging.info(f"Этап {stage}: начало.")
+            try:
+                outputs = await self._run_stage(stage, ctx)
+            except Exception as e:
+                logging.error(f"Произошла ошибка на этапе {stage}: {e}")
+                raise PipelineError(f"Этап {stage}: {e}") from e
+            ctx.update(outputs)
+
+            if stage == "fetch":
+                ctx["systime"] = snapshot_systime(ctx["raw"])
+            self._store(ctx["systime"], stage, {key: ctx[key] for key in OUTPUTS[stage]})
+
+        if self.use_cache:
+            self._prune()
+        return ctx
+
+    async def cached_contexts(self, limit=None):
+        """Контексты последних limit закэшированных снимков до этапа spread, от старых к новым."""
+        systimes = self.cached_systimes()
+        if limit:
+            systimes = systimes[-limit:]
+        return [await self.run_async(systime=systime, until="spread") for systime in systimes]
+
+    def run(self, stages=None, systime=None):
+        return asyncio.run(self.run_async(stages, systime))
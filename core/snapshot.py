@@ -0,0 +1,374 @@
+"""Облегчённое представление снимка рынка без pandas.
+
+Строки futures/shares/total/spread хранятся в объектах со ``__slots__``,
+расчёт kerry, kerry_year и спредов повторяет core.data_processor
+(включая округление и деление на ноль как в numpy). В DataFrame снимок
+переводится только для анализа через ``to_dataframe``; загрузку и сохранение
+выполняет core.pipeline.
+"""
+import csv
+import io
+import math
+import os
+import sqlite3
+from datetime import datetime
+from itertools import groupby
+
+from core.iss import replacements, split_iss_tables
+from core.logging_setup import SkipSummary
+
+
+class Record:
+    """Базовая запись снимка: доступ к полям как к атрибутам и по ключу."""
+
+    __slots__ = ()
+    # Типы колонок SQLite для создания таблицы (как у DataFrame.to_sql)
+    sql_types = {}
+
+    def __init__(self, **values):
+        for field in self.__slots__:
+            setattr(self, field, values.get(field))
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self):
+        values = ", ".join(f"{field}={getattr(self, field)!r}" for field in self.__slots__)
+        return f"{type(self).__name__}({values})"
+
+
+class FutureRow(Record):
+    __slots__ = ("SECID", "SHORTNAME", "LASTDELDATE", "ASSETCODE", "LOTVOLUME", "SYSTIME", "LAST", "TIME")
+
+
+class ShareRow(Record):
+    __slots__ = ("SECID", "SHORTNAME", "LAST", "TIME")
+
+
+class TotalRow(Record):
+    __slots__ = (
+        "SYSTIME", "ASSETCODE", "SHORTNAME_futures", "LAST_futures", "LOTVOLUME", "LASTDELDATE",
+        "TIME_futures", "SECID", "SHORTNAME_shares", "LAST_shares", "TIME_shares",
+        "days_to_expiry", "kerry", "kerry_year",
+    )
+    sql_types = {
+        "LAST_futures": "REAL",
+        "LOTVOLUME": "INTEGER",
+        "LASTDELDATE": "TIMESTAMP",
+        "LAST_shares": "REAL",
+        "days_to_expiry": "INTEGER",
+        "kerry": "REAL",
+        "kerry_year": "REAL",
+    }
+
+
+class SpreadRow(Record):
+    __slots__ = ("System_date", "Name_spread", "kerry_spread", "kerry_spread_y")
+    sql_types = {
+        "kerry_spread": "REAL",
+        "kerry_spread_y": "REAL",
+    }
+
+
+def _to_float(value):
+    """Разбор цены из CSV ISS: пустое или некорректное значение — NaN."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _to_numbers(values):
+    """Разбор колонки чисел как в pd.read_csv: int, если все значения целые, иначе float с NaN."""
+    try:
+        return [int(value) for value in values]
+    except (TypeError, ValueError):
+        return [_to_float(value) for value in values]
+
+
+def _to_datetime(value):
+    try:
+        return datetime.fromisoformat(value.strip())
+    except (AttributeError, ValueError):
+        return None
+
+
+def _div(a, b):
+    """Деление с семантикой numpy: x/0 даёт ±inf, 0/0 — NaN."""
+    if b == 0:
+        if a == 0 or math.isnan(a):
+            return math.nan
+        return math.copysign(math.inf, a) * math.copysign(1, b)
+    return a / b
+
+
+def _round2(value):
+    """Округление до двух знаков так же, как Series.round(2)."""
+    if value is None or math.isnan(value) or math.isinf(value):
+        return value
+    return round(value * 100) / 100
+
+
+def _is_nan(value):
+    return isinstance(value, float) and math.isnan(value)
+
+
+def parse_iss_table(text):
+    """Разбор таблицы ISS (заголовок + строки через ';') в список словарей."""
+    reader = csv.reader(io.StringIO(text), delimiter=";")
+    header = next(reader, [])
+    return [dict(zip(header, row)) for row in reader if row]
+
+
+def _join_on_secid(securities, marketdata):
+    """Внутреннее соединение по SECID с сохранением порядка securities."""
+    by_secid = {}
+    for row in marketdata:
+        by_secid.setdefault(row.get("SECID"), []).append(row)
+    for sec in securities:
+        for md in by_secid.get(sec.get("SECID"), ()):
+            yield sec, md
+
+
+def parse_futures(data):
+    """Формирование строк FutureRow из ответа ISS по фьючерсам."""
+    securities_data, marketdata_data = split_iss_tables(data, "futures")
+    pairs = list(_join_on_secid(parse_iss_table(securities_data), parse_iss_table(marketdata_data)))
+    lotvolumes = _to_numbers([sec.get("LOTVOLUME") for sec, _ in pairs])
+    prices = _to_numbers([md.get("LAST") for _, md in pairs])
+    rows = []
+    for (sec, md), lotvolume, price in zip(pairs, lotvolumes, prices):
+        assetcode = sec.get("ASSETCODE", "")
+        rows.append(
+            FutureRow(
+                SECID=sec["SECID"],
+                SHORTNAME=sec.get("SHORTNAME"),
+                LASTDELDATE=_to_datetime(sec.get("LASTDELDATE")),
+                ASSETCODE=replacements.get(assetcode, assetcode),
+                LOTVOLUME=lotvolume,
+                SYSTIME=md.get("SYSTIME"),
+                LAST=price,
+                TIME=md.get("TIME"),
+            )
+        )
+    return rows
+
+
+def parse_shares(data):
+    """Формирование строк ShareRow из ответа ISS по акциям."""
+    securities_data, marketdata_data = split_iss_tables(data, "shares")
+    pairs = list(_join_on_secid(parse_iss_table(securities_data), parse_iss_table(marketdata_data)))
+    prices = _to_numbers([md.get("LAST") for _, md in pairs])
+    return [
+        ShareRow(
+            SECID=sec["SECID"],
+            SHORTNAME=sec.get("SHORTNAME"),
+            LAST=price,
+            TIME=md.get("TIME"),
+        )
+        for (sec, md), price in zip(pairs, prices)
+    ]
+
+
+def compute_total(futures, shares):
+    """Расчёт строк total (kerry, kerry_year) без сохранения."""
+    systime_str = futures[0].SYSTIME
+    today_f = _to_datetime(systime_str)
+
+    shares_by_secid = {}
+    for share in shares:
+        shares_by_secid.setdefault(share.SECID, []).append(share)
+
+    total = []
+    for future in futures:
+        for share in shares_by_secid.get(future.ASSETCODE, ()):
+            if future.LASTDELDATE is not None and today_f is not None:
+                days_to_expiry = (future.LASTDELDATE - today_f).days + 1  # Разница в днях
+            else:
+                days_to_expiry = math.nan
+
+            # Вычисляем kerry и kerry_year
+            base = share.LAST * future.LOTVOLUME
+            kerry = _div(future.LAST - base, base) * 100
+            kerry_year = _div(kerry, days_to_expiry) * 365
+
+            total.append(
+                TotalRow(
+                    SYSTIME=future.SYSTIME,
+                    ASSETCODE=future.ASSETCODE,
+                    SHORTNAME_futures=future.SHORTNAME,
+                    LAST_futures=future.LAST,
+                    LOTVOLUME=future.LOTVOLUME,
+                    LASTDELDATE=future.LASTDELDATE,
+                    TIME_futures=future.TIME,
+                    SECID=share.SECID,
+                    SHORTNAME_shares=share.SHORTNAME,
+                    LAST_shares=share.LAST,
+                    TIME_shares=share.TIME,
+                    days_to_expiry=days_to_expiry,
+                    kerry=_round2(kerry),
+                    kerry_year=_round2(kerry_year),
+                )
+            )
+    return total
+
+
+def compute_spread(total):
+    """Расчёт строк spread (kerry_spread, kerry_spread_y) без сохранения."""
+    systime_str = total[0].SYSTIME if total else None
+    today_f = _to_datetime(systime_str) if systime_str else datetime.now()
+
+    spread = []
+    skipped = SkipSummary("Пропуски при формировании spread")
+    by_asset = sorted((row for row in total if row.ASSETCODE), key=lambda row: row.ASSETCODE)
+    for assetcode, group in groupby(by_asset, key=lambda row: row.ASSETCODE):
+        # Сортируем по дате экспирации
+        sorted_group = sorted(group, key=lambda row: row.LASTDELDATE or datetime.max)
+        for near, far in zip(sorted_group, sorted_group[1:]):
+            name_spread = f"{near.SHORTNAME_futures}-{far.SHORTNAME_futures}"
+
+            # Проверка условий для знаменателя
+            last_shares_zero = near.LAST_shares == 0
+            last_futures_zero = near.LAST_futures == 0
+            next_last_futures_zero = far.LAST_futures == 0
+
+            if last_shares_zero or last_futures_zero or next_last_futures_zero:
+                if last_shares_zero:
+                    skipped.add("нет сделок по базовому активу", name_spread)
+                if last_futures_zero:
+                    skipped.add("нет сделок по ближнему фчс", name_spread)
+                if next_last_futures_zero:
+                    skipped.add("нет сделок по дальнему фчс", name_spread)
+                continue
+
+            kerry_spread = _div(far.LAST_futures - near.LAST_futures, near.LAST_shares * near.LOTVOLUME) * 100
+
+            days_to_expiry = (far.LASTDELDATE - today_f).days + 1 if far.LASTDELDATE else 0
+            if days_to_expiry > 0:
+                kerry_spread_y = kerry_spread / days_to_expiry * 365
+            else:
+                kerry_spread_y = None
+                skipped.add("kerry_spread_y не вычислен, days_to_expiry <= 0", name_spread)
+
+            spread.append(
+                SpreadRow(
+                    System_date=systime_str,
+                    Name_spread=name_spread,
+                    kerry_spread=_round2(kerry_spread),
+                    kerry_spread_y=_round2(kerry_spread_y),
+                )
+            )
+
+    skipped.log()
+    return spread
+
+
+def nlargest(rows, n, column):
+    """Аналог DataFrame.nlargest: NaN и None пропускаются, при равенстве — первые."""
+    valid = [row for row in rows if row[column] is not None and not _is_nan(row[column])]
+    return sorted(valid, key=lambda row: row[column], reverse=True)[:n]
+
+
+def _csv_value(value):
+    if value is None or _is_nan(value):
+        return ""
+    if isinstance(value, datetime) and value == datetime(value.year, value.month, value.day):
+        return value.date().isoformat()
+    return value
+
+
+def _sql_value(value):
+    if _is_nan(value):
+        return None
+    if isinstance(value, datetime):
+        return str(value)
+    return value
+
+
+def save_table(name, columns, rows, sql_types=None, db_path="data/spread.db"):
+    """Сохранение строк-последовательностей в data/<name>/<name>_<дата>.csv и таблицу <name> SQLite."""
+    sql_types = sql_types or {}
+
+    os.makedirs(f"data/{name}", exist_ok=True)
+    today = datetime.now().strftime("%d-%m-%y")
+    with open(f"data/{name}/{name}_{today}.csv", "w", newline="") as file:
+        writer = csv.writer(file, lineterminator="\n")
+        writer.writerow(columns)
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        declared = ", ".join(f'"{column}" {sql_types.get(column, "TEXT")}' for column in columns)
+        conn.execute(f'CREATE TABLE IF NOT EXISTS "{name}" ({declared})')
+        placeholders = ", ".join("?" for _ in columns)
+        names = ", ".join(f'"{column}"' for column in columns)
+        conn.executemany(
+            f'INSERT INTO "{name}" ({names}) VALUES ({placeholders})',
+            ([_sql_value(value) for value in row] for row in rows),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def save_rows(rows, name, db_path="data/spread.db"):
+    """Сохранение строк снимка в data/<name>/<name>_<дата>.csv и таблицу <name> SQLite."""
+    if not rows:
+        return
+    fields = type(rows[0]).__slots__
+    save_table(name, fields, [[row[field] for field in fields] for row in rows], type(rows[0]).sql_types, db_path)
+
+
+def _to_value(value):
+    if value is None or value == "":
+        return None
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return value
+
+
+def futures_table(data):
+    """Полная таблица фьючерсов со всеми колонками ISS для сохранения.
+
+    Повторяет pd.merge по SECID: одноимённые колонки получают суффиксы _x/_y.
+    Возвращает (колонки, строки, типы SQLite).
+    """
+    securities_data, marketdata_data = split_iss_tables(data, "futures")
+    securities, marketdata = parse_iss_table(securities_data), parse_iss_table(marketdata_data)
+    sec_columns = list(securities[0]) if securities else []
+    md_columns = list(marketdata[0]) if marketdata else []
+    shared = (set(sec_columns) & set(md_columns)) - {"SECID"}
+
+    md_columns = [c for c in md_columns if c != "SECID"]
+    columns = [f"{c}_x" if c in shared else c for c in sec_columns]
+    columns += [f"{c}_y" if c in shared else c for c in md_columns]
+    rows = []
+    for sec, md in _join_on_secid(securities, marketdata):
+        row = [_to_value(sec.get(c)) for c in sec_columns] + [_to_value(md.get(c)) for c in md_columns]
+        if "ASSETCODE" in sec_columns:
+            index = sec_columns.index("ASSETCODE")
+            row[index] = replacements.get(row[index], row[index])
+        rows.append(row)
+
+    # Типы колонок как при выводе типов в pandas: float важнее int, иначе текст
+    sql_types = {}
+    for index, column in enumerate(columns):
+        kinds = {type(row[index]) for row in rows if row[index] is not None}
+        if kinds and kinds <= {int, float}:
+            sql_types[column] = "REAL" if float in kinds else "INTEGER"
+    return columns, rows, sql_types
+
+
+def to_dataframe(rows, record_type=None):
+    """Перевод строк снимка в DataFrame для анализа."""
+    import pandas as pd
+
+    record_type = record_type or (type(rows[0]) if rows else None)
+    columns = list(record_type.__slots__) if record_type else None
+    return pd.DataFrame([row.as_dict() for row in rows], columns=columns)
@@ -0,0 +1,277 @@
+import argparse
+import csv
+import glob
+import json
+import logging
+import os
+import sqlite3
+import sys
+from datetime import date, datetime, timedelta
+
+from core.logging_setup import setup_logging
+
+# Для каждой таблицы: колонка даты снимка и колонка фильтра по инструменту
+TABLES = {
+    "total": {"date": "SYSTIME", "key": "ASSETCODE"},
+    "futures": {"date": "SYSTIME", "key": "ASSETCODE"},
+    "spread": {"date": "System_date", "key": "Name_spread"},
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Потоковая выгрузка истории total/spread/futures.")
+    parser.add_argument("table", choices=TABLES)
+    parser.add_argument("-o", "--output", help="Файл результата (по умолчанию stdout)")
+    parser.add_argument("-f", "--format", choices=("csv", "jsonl", "parquet"), default="csv")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="Начало периода, YYYY-MM-DD")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="Конец периода включительно, YYYY-MM-DD")
+    parser.add_argument("--asset", action="append", help="ASSETCODE для total/futures (можно несколько раз)")
+    parser.add_argument("--spread", action="append", help="Name_spread для spread (можно несколько раз)")
+    parser.add_argument("--source", choices=("db", "archive"), default="db",
+                        help="data/spread.db или дневные CSV в data/<table>")
+    parser.add_argument("--db", default="data/spread.db")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args(argv)
+    if args.format == "parquet" and not args.output:
+        parser.error("Для формата parquet нужен --output.")
+    if args.table == "spread" and args.asset:
+        parser.error("--asset применим только к total и futures, для spread используйте --spread.")
+    if args.table != "spread" and args.spread:
+        parser.error("--spread применим только к таблице spread, для total и futures используйте --asset.")
+    return args
+
+
+def _key_values(args):
+    return (args.spread if args.table == "spread" else args.asset) or []
+
+
+def _stored_types(conn, name, columns, declared, condition, params):
+    """Тип колонок по фактически хранимым значениям (typeof), а не по объявленному типу.
+
+    Объявленный тип ненадёжен: to_sql выбирает его по первой записи, и в колонке
+    INTEGER могут лежать дробные значения. Целые и дробные вместе дают real,
+    любой текст — text; для колонок из одних NULL берётся объявленный тип.
+    """
+    checks = ", ".join(
+        f"MAX(typeof(\"{column}\") = 'integer'), MAX(typeof(\"{column}\") = 'real'), "
+        f"MAX(typeof(\"{column}\") IN ('text', 'blob'))"
+        for column in columns
+    )
+    flags = conn.execute(f'SELECT {checks} FROM "{name}"{condition}', params).fetchone()
+    types = {}
+    for index, column in enumerate(columns):
+        has_integer, has_real, has_text = flags[3 * index:3 * index + 3]
+        if has_text:
+            types[column] = "text"
+        elif has_real:
+            types[column] = "real"
+        elif has_integer:
+            types[column] = "integer"
+        else:
+            types[column] = declared.get(column, "").lower()
+    return types
+
+
+def iter_db_chunks(args):
+    """Чанки строк из SQLite: постоянная память независимо от длины периода."""
+    table = TABLES[args.table]
+    where, params = [], []
+    if args.date_from:
+        where.append(f'"{table["date"]}" >= ?')
+        params.append(args.date_from.isoformat())
+    if args.date_to:
+        where.append(f'"{table["date"]}" < ?')
+        params.append((args.date_to + timedelta(days=1)).isoformat())
+    keys = _key_values(args)
+    if keys:
+        where.append(f'"{table["key"]}" IN ({", ".join("?" for _ in keys)})')
+        params.extend(keys)
+
+    # Только чтение и короткие запросы: между чанками база не заблокирована и бот может писать
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    try:
+        declared = {row[1]: row[2] for row in conn.execute(f'PRAGMA table_info("{args.table}")')}
+        columns = list(declared)
+        if not columns:
+            raise ValueError(f"Таблица {args.table} не найдена в {args.db}.")
+
+        # Таблицы только дополняются, поэтому граница по rowid даёт согласованный срез:
+        # строки, добавленные во время выгрузки, не попадают ни в подсчёт, ни в выгрузку
+        max_rowid = conn.execute(f'SELECT MAX(rowid) FROM "{args.table}"').fetchone()[0] or 0
+        where.append("rowid <= ?")
+        params.append(max_rowid)
+        condition = f" WHERE {' AND '.join(where)}"
+
+        total_rows = conn.execute(f'SELECT COUNT(*) FROM "{args.table}"{condition}', params).fetchone()[0]
+        types = {}
+        if args.format == "parquet":
+            types = _stored_types(conn, args.table, columns, declared, condition, params)
+        yield columns, types, total_rows
+
+        names = ", ".join(f'"{column}"' for column in columns)
+        last_rowid = 0
+        while True:
+            # Каждый чанк — отдельный запрос по rowid, блокировка чтения снимается после него
+            rows = conn.execute(
+                f'SELECT rowid, {names} FROM "{args.table}"{condition} AND rowid > ? ORDER BY rowid LIMIT ?',
+                [*params, last_rowid, args.chunk_size],
+            ).fetchall()
+            if not rows:
+                break
+            last_rowid = rows[-1][0]
+            yield [row[1:] for row in rows]
+    finally:
+        conn.close()
+
+
+def _archive_files(args):
+    """Дневные CSV таблицы в хронологическом порядке с учётом периода."""
+    files = []
+    for path in glob.glob(f"data/{args.table}/{args.table}_*.csv"):
+        stamp = os.path.basename(path)[len(args.table) + 1:-4]
+        try:
+            day = datetime.strptime(stamp, "%d-%m-%y").date()
+        except ValueError:
+            continue
+        if (args.date_from and day < args.date_from) or (args.date_to and day > args.date_to):
+            continue
+        files.append((day, path))
+    return [path for _, path in sorted(files)]
+
+
+def iter_archive_chunks(args):
+    """Чанки строк из архива data/<table>/*.csv, файлы читаются построчно."""
+    files = _archive_files(args)
+    keys = set(_key_values(args))
+    key_column = TABLES[args.table]["key"]
+    columns = None
+    chunk = []
+    for number, path in enumerate(files, 1):
+        with open(path, "r", newline="") as file:
+            reader = csv.reader(file)
+            header = next(reader, None)
+            if header is None:
+                continue
+            if columns is None:
+                columns = header
+                yield columns, {}, None
+            index = header.index(key_column) if key_column in header else None
+            # Колонки файла могли поменяться — приводим строки к колонкам первого файла
+            positions = [header.index(column) if column in header else None for column in columns]
+            for row in reader:
+                if keys and (index is None or row[index] not in keys):
+                    continue
+                chunk.append(tuple(row[i] if i is not None else "" for i in positions))
+                if len(chunk) >= args.chunk_size:
+                    yield chunk
+                    chunk = []
+        logging.info(f"Обработан файл {number}/{len(files)}: {path}")
+    if columns is None:
+        yield [], {}, 0
+    if chunk:
+        yield chunk
+
+
+class CsvWriter:
+    def __init__(self, file, columns, types):
+        self.writer = csv.writer(file, lineterminator="\n")
+        self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        pass
+
+
+class JsonLinesWriter:
+    def __init__(self, file, columns, types):
+        self.file = file
+        self.columns = columns
+
+    def write(self, rows):
+        self.file.writelines(
+            json.dumps(dict(zip(self.columns, row)), ensure_ascii=False, default=str) + "\n" for row in rows
+        )
+
+    def close(self):
+        pass
+
+
+class ParquetWriter:
+    """Запись чанков в row group'ы Parquet; требует pyarrow."""
+
+    def __init__(self, file, columns, types):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Для выгрузки в Parquet установите pyarrow.")
+        self.pa = pa
+        # Схема по хранимым типам SQLite, чтобы все чанки писались одинаково
+        arrow_types = {"real": pa.float64(), "integer": pa.int64()}
+        self.schema = pa.schema([(column, arrow_types.get(types.get(column, ""), pa.string())) for column in columns])
+        self.columns = columns
+        self.writer = pq.ParquetWriter(file, self.schema)
+
+    def _convert(self, value, field):
+        if value is None or value == "":
+            return None
+        if self.pa.types.is_string(field.type):
+            return str(value)
+        # pyarrow молча отбрасывает дробную часть, поэтому несовпадение типа — ошибка
+        if self.pa.types.is_integer(field.type) and not isinstance(value, int):
+            raise ValueError(f"Колонка {field.name}: значение {value!r} не целое.")
+        return value
+
+    def write(self, rows):
+        arrays = [
+            self.pa.array([self._convert(row[i], field) for row in rows], type=field.type)
+            for i, field in enumerate(self.schema)
+        ]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {"csv": CsvWriter, "jsonl": JsonLinesWriter, "parquet": ParquetWriter}
+
+
+def export(args):
+    """Выгрузка с отчётом о прогрессе; возвращает число выгруженных строк."""
+    chunks = iter_db_chunks(args) if args.source == "db" else iter_archive_chunks(args)
+    columns, types, total_rows = next(chunks)
+    if not columns:
+        logging.warning("Нет данных для выгрузки.")
+        return 0
+    logging.info(f"Выгрузка {args.table}: {total_rows if total_rows is not None else '?'} строк.")
+
+    binary = args.format == "parquet"
+    if args.output:
+        file = open(args.output, "wb" if binary else "w", **({} if binary else {"newline": "", "encoding": "utf-8"}))
+    else:
+        file = sys.stdout
+    writer = WRITERS[args.format](file, columns, types)
+    written = 0
+    try:
+        for rows in chunks:
+            writer.write(rows)
+            written += len(rows)
+            progress = f" ({written / total_rows:.0%})" if total_rows else ""
+            logging.info(f"Выгружено строк: {written}{progress}")
+    finally:
+        writer.close()
+        if file is not sys.stdout:
+            file.close()
+    logging.info(f"Выгрузка завершена: {written} строк.")
+    return written
+
+
+if __name__ == "__main__":
+    setup_logging("data/export_history.log")
+    try:
+        export(parse_args())
+    except Exception as e:
+        logging.error(f"Ошибка при выгрузке истории: {e}")
+        exit(1)
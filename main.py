@@ -2,32 +2,39 @@ import asyncio
 import logging
 import os
 import nest_asyncio
+from core.logging_setup import setup_logging
 from telegram_bot.bot import run_telegram_bot
 
 from dotenv import load_dotenv
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - [%(levelname)s]: %(message)s",
-    datefmt='%d.%m.%Y %H:%M:%S',  # Формат даты
-    handlers=[
-        logging.FileHandler("data/log.log"),  # Логи будут записываться в файл app.log
-        logging.StreamHandler()  # Логи также будут выводиться в консоль
-    ]
-)
 logger = logging.getLogger(__name__)
 
-# Загрузка переменных окружения
-load_dotenv()
-# Получаем токен
-TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+# Настройка только при запуске бота: процессы графиков (spawn) импортируют этот модуль заново
+if __name__ == "__main__":
+    # Настройка логирования: запись на диск в фоновом потоке, не блокирует цикл событий
+    setup_logging("data/log.log")
 
-if not TELEGRAM_BOT_TOKEN:
-    logger.error("Токен Telegram не найден в .env")
-    raise ValueError("Токен Telegram не задан")
+    # Загрузка переменных окружения
+    load_dotenv()
+    # Получаем токен
+    TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+    # Представление снимка: "light" (без pandas) или "pandas"
+    SNAPSHOT_MODE = os.getenv('SNAPSHOT_MODE', 'light')
+    # Локальный HTTP API снимков (не запускается, если порт не задан)
+    API_HOST = os.getenv('API_HOST', '127.0.0.1')
+    API_PORT = int(os.getenv('API_PORT', '0'))
+    # Расписание: время дайджеста по Москве или интервал в минутах внутри торговых сессий
+    SCHEDULE = {
+        "times": os.getenv('SCHEDULE_TIMES', '11:34,16:34,23:34').split(','),
+        "interval": int(os.getenv('SCHEDULE_INTERVAL', '0')),
+        "jitter": int(os.getenv('SCHEDULE_JITTER', '30')),
+    }
+    # Ранжирование топа: zscore, percentile или kerry_year (сырое значение)
+    RANK_BY = os.getenv('RANK_BY', 'zscore')
 
+    if not TELEGRAM_BOT_TOKEN:
+        logger.error("Токен Telegram не найден в .env")
+        raise ValueError("Токен Telegram не задан")
 
-if __name__ == "__main__":
     nest_asyncio.apply()
-    asyncio.run(run_telegram_bot(TELEGRAM_BOT_TOKEN))
+    asyncio.run(run_telegram_bot(TELEGRAM_BOT_TOKEN, SNAPSHOT_MODE, API_PORT, API_HOST, SCHEDULE, RANK_BY))
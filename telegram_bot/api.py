@@ -0,0 +1,215 @@
+import gzip
+import hashlib
+import json
+import logging
+import math
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Таблицы, которые отдаёт API
+TABLES = ("total", "spread")
+# Максимум закэшированных ответов с фильтрами
+FILTERED_CACHE_SIZE = 128
+
+
+def _clean(value):
+    """Приведение значения к JSON: даты — строкой, NaN/inf — null."""
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return None
+    if isinstance(value, datetime):
+        return str(value)
+    if hasattr(value, "item"):  # скаляры numpy
+        return _clean(value.item())
+    return value
+
+
+def as_dicts(data):
+    """Строки снимка (DataFrame или записи core.snapshot) в список словарей."""
+    if hasattr(data, "to_dict"):
+        rows = data.to_dict("records")
+    else:
+        rows = [row.as_dict() for row in data]
+    return [{key: _clean(value) for key, value in row.items()} for row in rows]
+
+
+def _snapshot_systime(rows):
+    return rows["total"][0].get("SYSTIME") if rows["total"] else None
+
+
+def _dump(rows):
+    """Сериализация строк без внешних скобок, чтобы склеивать историю без пересборки."""
+    return json.dumps(rows, ensure_ascii=False, separators=(",", ":"), default=str)[1:-1].encode()
+
+
+class Response:
+    """Заранее сериализованный ответ: тело, его gzip-версия и ETag каждого варианта."""
+
+    __slots__ = ("body", "gzipped", "etag", "etag_gzip")
+
+    def __init__(self, body):
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=6)
+        digest = hashlib.sha1(body).hexdigest()[:20]
+        self.etag = f'"{digest}"'
+        self.etag_gzip = f'"{digest}-gz"'
+
+
+class SnapshotStore:
+    """Последний снимок total/spread и история последних снимков для HTTP API."""
+
+    def __init__(self, history_size=48):
+        self.history_size = history_size
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=history_size)
+        self._responses = {}
+        self._rows = {}
+        self._filtered = OrderedDict()
+        self.systime = None
+
+    def publish(self, total, spread):
+        """Публикация снимка: сериализация выполняется один раз.
+
+        Повторная публикация снимка с тем же SYSTIME заменяет последний снимок истории.
+        """
+        rows = {"total": as_dicts(total), "spread": as_dicts(spread)}
+        fragments = {name: _dump(table) for name, table in rows.items()}
+        systime = _snapshot_systime(rows)
+
+        # Сериализация вне блокировки: публикует снимки только один поток
+        history = list(self._history)
+        replace = systime is not None and bool(history) and _snapshot_systime(history[-1][0]) == systime
+        if replace:
+            history.pop()
+        history = history[1 - self._history.maxlen:] + [(rows, fragments)]
+        responses = {name: Response(b"[" + fragments[name] + b"]") for name in TABLES}
+        for name in TABLES:
+            parts = [snapshot_fragments[name] for _, snapshot_fragments in history]
+            responses[f"history/{name}"] = Response(b"[" + b",".join(p for p in parts if p) + b"]")
+
+        with self._lock:
+            if replace:
+                self._history.pop()
+            self._history.append((rows, fragments))
+            self._rows = rows
+            self._responses = responses
+            self._filtered.clear()
+            self.systime = systime
+
+        logging.info(f"Снимок {systime} опубликован в API.")
+
+    def latest(self, name):
+        """Строки последнего снимка таблицы в виде словарей."""
+        return self._rows.get(name, [])
+
+    def get(self, path, query):
+        """Ответ для пути и параметров запроса или None, если таблица неизвестна."""
+        with self._lock:
+            if path not in self._responses:
+                return None
+            if not query:
+                return self._responses[path]
+
+            key = (path, tuple(sorted((k, tuple(v)) for k, v in query.items())))
+            cached = self._filtered.get(key)
+            if cached is not None:
+                self._filtered.move_to_end(key)
+                return cached
+            history = list(self._history)
+
+        response = Response(json.dumps(self._select(path, history, query), ensure_ascii=False,
+                                       separators=(",", ":"), default=str).encode())
+        with self._lock:
+            self._filtered[key] = response
+            if len(self._filtered) > FILTERED_CACHE_SIZE:
+                self._filtered.popitem(last=False)
+        return response
+
+    @staticmethod
+    def _select(path, history, query):
+        """Фильтрация строк: columns=a,b; limit=N (для истории); <колонка>=v1,v2."""
+        query = dict(query)
+        columns = [c for c in ",".join(query.pop("columns", [])).split(",") if c]
+        limit = query.pop("limit", [None])[-1]
+        filters = {key: set(",".join(values).split(",")) for key, values in query.items()}
+
+        name = path.split("/")[-1]
+        snapshots = history if path.startswith("history/") else history[-1:]
+        if limit is not None:
+            limit = int(limit)
+            if limit < 0:
+                raise ValueError("limit не может быть отрицательным")
+            snapshots = snapshots[-limit:] if limit else []
+
+        result = []
+        for rows, _ in snapshots:
+            for row in rows[name]:
+                if all(str(row.get(key)) in values for key, values in filters.items()):
+                    result.append({c: row.get(c) for c in columns} if columns else row)
+        return result
+
+
+class SnapshotRequestHandler(BaseHTTPRequestHandler):
+    store = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path.strip("/")
+        if self.store.systime is None:
+            return self._send_error(503, "Снимок ещё не сформирован.")
+        try:
+            response = self.store.get(path, parse_qs(url.query))
+        except ValueError as e:
+            return self._send_error(400, f"Некорректный запрос: {e}")
+        if response is None:
+            return self._send_error(404, f"Неизвестный путь: /{path}")
+
+        # У gzip-варианта свой ETag, чтобы кэши не путали представления
+        use_gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+        etag = response.etag_gzip if use_gzip else response.etag
+        tags = self._if_none_match()
+        if etag in tags or "*" in tags:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Vary", "Accept-Encoding")
+            self.end_headers()
+            return
+
+        body = response.gzipped if use_gzip else response.body
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _if_none_match(self):
+        header = self.headers.get("If-None-Match", "")
+        return {tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()}
+
+    def _send_error(self, status, message):
+        body = json.dumps({"error": message}, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f"API {self.address_string()}: {format % args}")
+
+
+def start_api_server(store, host="127.0.0.1", port=8080):
+    """Запуск HTTP API снимков в фоновом потоке."""
+    handler = type("Handler", (SnapshotRequestHandler,), {"store": store})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="snapshot-api", daemon=True).start()
+    logging.info(f"HTTP API снимков запущен на http://{host}:{port}")
+    return server
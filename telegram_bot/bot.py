@@ -1,10 +1,15 @@
-import aiocron
 import asyncio
 import logging
 from telegram import Update, Bot
 from telegram.constants import ParseMode
 from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes
 
+from core.carry_stats import CarryStats
+from core.pipeline import SnapshotPipeline
+from telegram_bot.api import SnapshotStore, start_api_server
+from telegram_bot.charts import ChartRenderer
+from telegram_bot.scheduler import AdaptiveScheduler
+
 user_states = {}
 
 
@@ -14,6 +19,26 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("Вы успешно подписаны на уведомления.")
 
 
+async def chart(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /chart <актив>: кривая кэрри и история спредов по последнему снимку."""
+    if not context.args:
+        await update.message.reply_text("Укажите актив, например: /chart SBER")
+        return
+
+    asset = context.args[0].upper()
+    try:
+        image = await context.application.bot_data["charts"].get(asset)
+    except Exception as e:
+        logging.error(f"Ошибка при построении графика {asset}: {e}")
+        await update.message.reply_text("Не удалось построить график.")
+        return
+
+    if image is None:
+        await update.message.reply_text(f"Нет данных по {asset} в последнем снимке.")
+        return
+    await update.message.reply_photo(photo=image, caption=f"{asset}: кэрри, % год")
+
+
 async def send_message_to_active_users(bot: Bot, message: str):
     """Отправка сообщения всем подписчикам"""
     for user_id in user_states:
@@ -24,52 +49,142 @@ async def send_message_to_active_users(bot: Bot, message: str):
                 parse_mode=ParseMode.HTML
             )
         except Exception as e:
-            logging.error(f"Не удалось отправить сообщение пользователю {user_id}: {e}")
+            logging.error(f"Не удалось отправить сообщение пользователю {user_id}: {e}", extra={"key": f"send:{user_id}"})
+
+
+def nlargest(data, n, column):
+    """Топ-n строк DataFrame или списка записей по колонке."""
+    if hasattr(data, "nlargest"):
+        return data.nlargest(n, column)
+    from core.snapshot import nlargest as nlargest_rows
+
+    return nlargest_rows(data, n, column)
+
+
+def top_by_score(data, scores, key_column, value_column, rank_by="zscore", n=5):
+    """Топ-n по z-оценке или перцентилю относительно истории контракта.
+
+    Строки без достаточной истории (новые контракты и спреды) добирают топ до n
+    по самому значению; пока истории нет ни у одной строки, ранжирование идёт по значению.
+    """
+    if rank_by in ("zscore", "percentile"):
+        ranked, unscored = [], []
+        for row in iter_rows(data):
+            z, pct = scores.get(row[key_column], (None, None))
+            if z is not None:
+                ranked.append(((z,) if rank_by == "zscore" else (pct, z), row))
+            else:
+                unscored.append(row)
+        if ranked:
+            ranked.sort(key=lambda item: item[0], reverse=True)
+            top = [row for _, row in ranked[:n]]
+            return top + nlargest(unscored, n - len(top), value_column)
+    return nlargest(data, n, value_column)
+
+
+def schedule_tasks(application, snapshot_mode="light", store=None, schedule=None, rank_by="zscore"):
+    # Статистика кэрри по контрактам и спредам переживает перезапуски
+    carry_stats = CarryStats().load()
+    title_suffix = {"zscore": " (по z-оценке)", "percentile": " (по перцентилю)"}.get(rank_by, "")
+
+    def publish(ctx):
+        """Публикация снимка для API и графиков и обновление статистики — при каждом запуске."""
+        total, spread = ctx["total"], ctx["spread"]
+        if store is not None:
+            store.publish(total, spread)
+
+        # Оценка необычности кэрри относительно собственной истории; снимок учитывается в статистике один раз
+        scores_total = carry_stats.observe(
+            ((row["SHORTNAME_futures"], row["kerry_year"]) for row in iter_rows(total)), ctx["systime"]
+        )
+        scores_spread = carry_stats.observe(
+            ((row["Name_spread"], row["kerry_spread_y"]) for row in iter_rows(spread)), ctx["systime"]
+        )
+        carry_stats.save()
+        return {"scores_total": scores_total, "scores_spread": scores_spread}
+
+    async def notify(ctx):
+        """Рассылка топов подписчикам — один раз на снимок."""
+        total, spread = ctx["total"], ctx["spread"]
+        scores_total, scores_spread = ctx["scores_total"], ctx["scores_spread"]
+
+        # Формируем сообщения
+        # Топ-5 позиций из total
+        top_total = top_by_score(total, scores_total, "SHORTNAME_futures", "kerry_year", rank_by)
+        message_total = format_df_for_telegram(
+            top_total, f"📊 Топ-5 по Кэрри, % год{title_suffix}:", scores_total
+        )
+        await send_message_to_active_users(application.bot, message_total)
+
+        # Топ-5 позиций из spread
+        top_spread = top_by_score(spread, scores_spread, "Name_spread", "kerry_spread_y", rank_by)
+        message_spread = format_df_for_telegram_spread(
+            top_spread, f"📈 Топ-5 по Кэрри спреда, % год{title_suffix}:", scores_spread
+        )
+        await send_message_to_active_users(application.bot, message_spread)
+
+        logging.info("Сообщения отправлены по расписанию.")
 
+    # Тот же конвейер, что и в get_kerry.py; снимок публикуется всегда, но сохраняется и рассылается один раз
+    # Кэш хранит столько снимков, сколько история API, чтобы восстановить её после перезапуска
+    keep_snapshots = store.history_size if store is not None else 10
+    pipeline = SnapshotPipeline(
+        snapshot_mode, notify=notify, publish=publish, notify_once=True, keep_snapshots=keep_snapshots
+    )
 
-def schedule_tasks(application):
-    @aiocron.crontab("34 11,16,23 * * MON-FRI")  # 11:00, 17:00, 23:00 по будням
     async def scheduled_task():
         logging.info("Запущена фоновая задача по расписанию")
-        from core.data_loader import load_futures_data, load_shares_data
-        from core.data_processor import calculate_total, calculate_spread
 
         try:
+            # Свежий снимок публикуется только после снимка из кэша
+            await seeding
             logging.info("Выполняется обновление данных...")
-    
-            futures = load_futures_data()
-            set_asset = set(futures["ASSETCODE"])
-            shares = load_shares_data(set_asset)
-    
-            total = calculate_total(futures, shares)
-            spread = calculate_spread(total)
-
-            # Формируем сообщения
-            # Топ-5 позиций из total
-            top_total = total.nlargest(5, "kerry_year")
-            message_total = format_df_for_telegram(top_total, "📊 Топ-5 по Кэрри, % год:")
-            await send_message_to_active_users(application.bot, message_total)
-           
-            # Топ-5 позиций из spread
-            top_spread = spread.nlargest(5, "kerry_spread_y")
-            message_spread = format_df_for_telegram_spread(top_spread, "📈 Топ-5 по Кэрри спреда, % год:")
-            await send_message_to_active_users(application.bot, message_spread)
-
-            logging.info("Сообщения отправлены по расписанию.")
+            await pipeline.run_async()
 
         except Exception as e:
             logging.error(f"Ошибка при выполнении фоновой задачи: {e}")
 
-        logging.info("Фоновая задача по расписанию добавлена")
+    async def publish_cached():
+        # После перезапуска API, его история и /chart сразу отдают закэшированные снимки
+        if store is None:
+            return
+        try:
+            for ctx in await pipeline.cached_contexts(store.history_size):
+                store.publish(ctx["total"], ctx["spread"])
+        except Exception as e:
+            logging.error(f"Не удалось опубликовать снимки из кэша: {e}")
+
+    seeding = asyncio.ensure_future(publish_cached())
+
+    # Торговые дни и сессии MOEX по кэшу календаря, время по Москве
+    scheduler = AdaptiveScheduler(scheduled_task, **(schedule or {}))
+    scheduler.start()
+    logging.info("Фоновая задача по расписанию добавлена")
+    return scheduler
+
+
+def iter_rows(data):
+    """Перебор строк DataFrame или списка записей core.snapshot."""
+    if hasattr(data, "iterrows"):
+        return (row for _, row in data.iterrows())
+    return iter(data)
+
+
+def format_scores(scores, key):
+    """Строки с z-оценкой и перцентилем, если по ключу достаточно истории."""
+    z, pct = (scores or {}).get(key, (None, None))
+    if z is None:
+        return ""
+    return f"      z-оценка: {z:.2f}\n      Перцентиль: {pct * 100:.0f}%\n"
 
 
 # Форматирование для фчс
-def format_df_for_telegram(df, title=""):
-    if df.empty:
+def format_df_for_telegram(df, title="", scores=None):
+    if len(df) == 0:
         return f"<b>{title}</b>\nНет данных для отображения."
     
     lines = [f"<b>{title}</b>"]
-    for _, row in df.iterrows():
+    for row in iter_rows(df):
         line = (
             f"• <b>{row['SHORTNAME_futures']}:</b>\n"
             f"      Базовый актив: {row['SHORTNAME_shares']}\n"
@@ -79,35 +194,47 @@ def format_df_for_telegram(df, title=""):
             f"      Последняя цена акции: {row['LAST_shares']}\n"
             f"      Кол-во лотов в фчс: {row['LOTVOLUME']}\n"
             f"      Дней до истечения: {row['days_to_expiry']}\n"
+            f"{format_scores(scores, row['SHORTNAME_futures'])}"
         )
         lines.append(line)
     return "\n".join(lines)
 
 
 # Форматирование для спреда фчс
-def format_df_for_telegram_spread(df, title=""):
-    if df.empty:
+def format_df_for_telegram_spread(df, title="", scores=None):
+    if len(df) == 0:
         return f"<b>{title}</b>\nНет данных для отображения."
     
     lines = [f"<b>{title}</b>"]
-    for _, row in df.iterrows():
+    for row in iter_rows(df):
         line = (
             f"• <b> {row['Name_spread']}:</b>\n"
             f"      Кэрри, % год: {row['kerry_spread_y']}\n"
             f"      Кэрри, %: {row['kerry_spread']}\n"
-
+            f"{format_scores(scores, row['Name_spread'])}"
         )
         lines.append(line)
     return "\n".join(lines)
 
 
-async def run_telegram_bot(TOKEN):
+async def run_telegram_bot(TOKEN, snapshot_mode="light", api_port=None, api_host="127.0.0.1", schedule=None,
+                           rank_by="zscore"):
 
     loop = asyncio.get_event_loop()
     application = ApplicationBuilder().token(TOKEN).build()
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("chart", chart))
+
+    # Последний снимок для локального HTTP API и графиков
+    store = SnapshotStore()
+    if api_port:
+        start_api_server(store, api_host, api_port)
+    application.bot_data["charts"] = ChartRenderer(store)
 
     # Добавляем задачу по расписанию
-    schedule_tasks(application)
+    schedule_tasks(application, snapshot_mode, store, schedule, rank_by)
     logging.info("Бот запущен. Ожидание команды /start или запуск по расписанию...")
-    loop.run_until_complete(application.run_polling())
\ No newline at end of file
+    try:
+        loop.run_until_complete(application.run_polling())
+    finally:
+        application.bot_data["charts"].shutdown()
\ No newline at end of file
@@ -0,0 +1,164 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import sqlite3
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+# Предел суммарного размера закэшированных PNG
+CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+
+def _warm_up():
+    """Импорт matplotlib в рабочем процессе заранее, чтобы первый график строился быстро."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401
+
+
+def render_chart(asset, total_rows, db_path="data/spread.db"):
+    """PNG с кривой kerry_year по дням до экспирации и историей кэрри спредов актива.
+
+    Выполняется в рабочем процессе: получает только простые данные и читает историю
+    спредов из SQLite в режиме только для чтения.
+    """
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    rows = sorted(total_rows, key=lambda row: (row["days_to_expiry"] is None, row["days_to_expiry"] or 0))
+    names = [row["SHORTNAME_futures"] for row in rows]
+    spread_names = [f"{near}-{far}" for near, far in zip(names, names[1:])]
+
+    history = {}
+    if spread_names:
+        conn = None
+        try:
+            # Нет базы или таблицы spread — строим только кривую кэрри
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+            cursor = conn.execute(
+                f'SELECT System_date, Name_spread, kerry_spread_y FROM spread '
+                f'WHERE Name_spread IN ({", ".join("?" for _ in spread_names)}) ORDER BY System_date',
+                spread_names,
+            )
+            for system_date, name, value in cursor:
+                history.setdefault(name, []).append((datetime.fromisoformat(system_date), value))
+        except (sqlite3.Error, TypeError, ValueError):
+            history = {}
+        finally:
+            if conn is not None:
+                conn.close()
+
+    fig, (ax_curve, ax_history) = plt.subplots(2, 1, figsize=(8, 8))
+    try:
+        points = [
+            (row["days_to_expiry"], row["kerry_year"], row["SHORTNAME_futures"])
+            for row in rows
+            if row["days_to_expiry"] is not None and row["kerry_year"] is not None
+        ]
+        if points:
+            ax_curve.plot([x for x, _, _ in points], [y for _, y, _ in points], marker="o")
+            for x, y, name in points:
+                ax_curve.annotate(name, (x, y), textcoords="offset points", xytext=(0, 6), ha="center", fontsize=8)
+        ax_curve.set_title(f"{asset}: кэрри, % год по дням до экспирации")
+        ax_curve.set_xlabel("Дней до истечения")
+        ax_curve.set_ylabel("Кэрри, % год")
+        ax_curve.grid(True, alpha=0.3)
+
+        for name, values in history.items():
+            ax_history.plot([date for date, _ in values], [value for _, value in values], marker=".", label=name)
+        if history:
+            ax_history.legend(fontsize=8)
+            ax_history.tick_params(axis="x", labelrotation=30, labelsize=7)
+        else:
+            ax_history.text(0.5, 0.5, "Нет истории спредов", ha="center", va="center",
+                            transform=ax_history.transAxes)
+        ax_history.set_title("История кэрри спредов, % год")
+        ax_history.grid(True, alpha=0.3)
+
+        fig.tight_layout()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png", dpi=100)
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+
+class ChartCache:
+    """LRU-кэш PNG по (актив, SYSTIME) с ограничением по суммарному размеру."""
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+
+    def get(self, key):
+        image = self._items.get(key)
+        if image is not None:
+            self._items.move_to_end(key)
+        return image
+
+    def put(self, key, image):
+        if len(image) > self.max_bytes:
+            return
+        if key in self._items:
+            self.size -= len(self._items.pop(key))
+        self._items[key] = image
+        self.size += len(image)
+        while self.size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= len(evicted)
+
+
+class ChartRenderer:
+    """Построение графиков в отдельном процессе, чтобы не блокировать цикл событий."""
+
+    def __init__(self, store, db_path="data/spread.db", cache=None):
+        self.store = store
+        self.db_path = db_path
+        self.cache = cache or ChartCache()
+        self._pending = {}
+        # Процесс создаётся при первом /chart, а не при запуске бота
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn: безопасно при работающих потоках бота и доступно на всех платформах
+            self._executor = ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn"), initializer=_warm_up
+            )
+        return self._executor
+
+    async def get(self, asset):
+        """PNG для актива по последнему снимку или None, если данных нет."""
+        asset = asset.upper()
+        systime = self.store.systime
+        rows = [row for row in self.store.latest("total") if str(row.get("ASSETCODE")).upper() == asset]
+        if systime is None or not rows:
+            return None
+
+        key = (asset, systime)
+        image = self.cache.get(key)
+        if image is not None:
+            return image
+
+        # Одновременные запросы одного графика ждут один и тот же рендер
+        if key not in self._pending:
+            loop = asyncio.get_running_loop()
+            self._pending[key] = loop.run_in_executor(self._get_executor(), render_chart, asset, rows, self.db_path)
+        try:
+            image = await self._pending[key]
+        finally:
+            self._pending.pop(key, None)
+        self.cache.put(key, image)
+        logging.info(f"Построен график {asset} для снимка {systime}")
+        return image
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,296 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import requests
+
+from core.files import write_atomic
+
+MOSCOW = ZoneInfo("Europe/Moscow")
+
+# Торговые периоды, когда есть и фьючерсы, и акции: основная сессия
+# с дневным клирингом 14:00–14:05 и вечерняя сессия после клиринга 18:50–19:05
+DEFAULT_SESSIONS = [("10:00", "14:00"), ("14:05", "18:40"), ("19:05", "23:50")]
+# Время рассылки дайджеста по Москве
+DEFAULT_TIMES = ["11:34", "16:34", "23:34"]
+# Насколько поздно ещё можно выполнить пропущенный запуск
+DEFAULT_GRACE = timedelta(minutes=30)
+# Календарь торговых дней ISS: по каждому дню признаки работы рынков, ответ постраничный
+CALENDAR_URL = (
+    "https://iss.moex.com/iss/calendars.json"
+    "?from={start}&till={till}&start={offset}&show_all_days=1"
+    "&iss.only=off_days,off_days.cursor&iss.meta=off"
+)
+# Как часто обновлять кэш календаря и на сколько дней вперёд его запрашивать
+CALENDAR_MAX_AGE = timedelta(days=7)
+CALENDAR_DAYS_AHEAD = 365
+# Пауза перед повторной загрузкой календаря после ошибки: удваивается до максимума
+CALENDAR_RETRY_MIN = timedelta(minutes=10)
+CALENDAR_RETRY_MAX = timedelta(hours=12)
+# Предел числа страниц календаря на случай, если ISS не понимает start
+CALENDAR_MAX_PAGES = 20
+
+
+def _parse_time(value):
+    return datetime.strptime(value.strip(), "%H:%M").time()
+
+
+def fetch_trading_days(start, till):
+    """Торговые дни фондового и срочного рынков MOEX из ISS: {дата: торгуется ли}.
+
+    Бот считает кэрри по фьючерсам и акциям, поэтому день торговый, только если
+    работают оба рынка.
+    """
+    days = {}
+    offset = 0
+    for _ in range(CALENDAR_MAX_PAGES):
+        url = CALENDAR_URL.format(start=start.isoformat(), till=till.isoformat(), offset=offset)
+        response = requests.get(url, timeout=30)
+        if response.status_code != 200:
+            raise ConnectionError(f"Ошибка при загрузке торгового календаря: {response.status_code}")
+        data = response.json()
+        table = data["off_days"]
+        rows = [dict(zip(table["columns"], row)) for row in table["data"]]
+        if not rows:
+            break
+
+        known = len(days)
+        for row in rows:
+            if "tradedate" not in row:
+                raise ValueError(f"В календаре ISS нет колонки tradedate: {table['columns']}")
+            flags = [row[key] for key in ("stock_workday", "futures_workday") if key in row]
+            if not flags and "is_work_day" in row:
+                flags = [row["is_work_day"]]
+            if not flags:
+                raise ValueError(f"В календаре ISS нет признаков рабочего дня: {table['columns']}")
+            days[date.fromisoformat(row["tradedate"])] = all(int(flag) == 1 for flag in flags)
+
+        # Следующая страница: по курсору, а без него — пока приходят новые дни
+        cursor = data.get("off_days.cursor")
+        if cursor and cursor.get("data"):
+            position = dict(zip(cursor["columns"], cursor["data"][0]))
+            offset = position["INDEX"] + position["PAGESIZE"]
+            if offset >= position["TOTAL"]:
+                break
+        elif len(days) > known:
+            offset += len(rows)
+        else:
+            break
+
+    if not days:
+        raise ValueError("ISS вернул пустой торговый календарь.")
+    if max(days) < till:
+        logging.warning(f"Торговый календарь ISS известен только до {max(days)}.")
+    return days
+
+
+class TradingCalendar:
+    """Торговый календарь MOEX из кэша data/calendar.json.
+
+    Формат файла: {"holidays": ["2025-01-01", ...], "workdays": ["2025-11-01", ...],
+    "sessions": [["10:00", "14:00"], ...]}. workdays — торговые выходные дни.
+    Файл создаётся и раз в CALENDAR_MAX_AGE обновляется из ISS методом refresh;
+    sessions можно задать вручную, при обновлении они сохраняются.
+    """
+
+    def __init__(self, path="data/calendar.json", max_age=CALENDAR_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self.holidays = set()
+        self.workdays = set()
+        self.sessions = [(_parse_time(start), _parse_time(end)) for start, end in DEFAULT_SESSIONS]
+        self._failures = 0
+        self._retry_at = 0.0
+        self.load()
+
+    def is_stale(self):
+        if not os.path.exists(self.path):
+            return True
+        return time.time() - os.path.getmtime(self.path) > self.max_age.total_seconds()
+
+    def needs_refresh(self):
+        """Кэш устарел и пауза после неудачной загрузки прошла."""
+        return self.is_stale() and time.monotonic() >= self._retry_at
+
+    def refresh(self, force=False):
+        """Обновление кэша календаря из ISS, если он устарел; при ошибке остаётся прежний кэш."""
+        if not force and not self.needs_refresh():
+            return False
+        today = datetime.now(MOSCOW).date()
+        try:
+            days = fetch_trading_days(today - timedelta(days=7), today + timedelta(days=CALENDAR_DAYS_AHEAD))
+        except Exception as e:
+            # Повтор не раньше чем через паузу, чтобы не обращаться к ISS на каждом проходе
+            self._failures += 1
+            delay = min(CALENDAR_RETRY_MIN * 2 ** (self._failures - 1), CALENDAR_RETRY_MAX)
+            self._retry_at = time.monotonic() + delay.total_seconds()
+            logging.error(f"Не удалось обновить торговый календарь из ISS: {e}. "
+                          f"Повтор через {delay.total_seconds() / 60:.0f} мин.")
+            return False
+        self._failures = 0
+        self._retry_at = 0.0
+
+        data = {
+            "holidays": sorted(day.isoformat() for day, trading in days.items() if not trading and day.weekday() < 5),
+            "workdays": sorted(day.isoformat() for day, trading in days.items() if trading and day.weekday() >= 5),
+            "sessions": [[f"{start:%H:%M}", f"{end:%H:%M}"] for start, end in self.sessions],
+        }
+        write_atomic(self.path, lambda file: json.dump(data, file))
+        logging.info(f"Торговый календарь обновлён из ISS: {min(days)} — {max(days)}.")
+        self.load()
+        return True
+
+    def load(self):
+        if not os.path.exists(self.path):
+            logging.warning(f"Торговый календарь {self.path} не найден, учитываются только выходные.")
+            return
+        try:
+            with open(self.path, "r") as file:
+                data = json.load(file)
+            self.holidays = {date.fromisoformat(day) for day in data.get("holidays", [])}
+            self.workdays = {date.fromisoformat(day) for day in data.get("workdays", [])}
+            if data.get("sessions"):
+                self.sessions = [(_parse_time(start), _parse_time(end)) for start, end in data["sessions"]]
+            logging.info(f"Торговый календарь загружен: {len(self.holidays)} праздничных дней.")
+        except Exception as e:
+            logging.error(f"Ошибка при чтении торгового календаря {self.path}: {e}")
+
+    def is_trading_day(self, day):
+        if day in self.workdays:
+            return True
+        return day.weekday() < 5 and day not in self.holidays
+
+    def slot_time(self, value):
+        """Время запуска в торговый день: value внутри сессии, иначе открытие следующей сессии или None."""
+        for start, end in self.sessions:
+            if start <= value < end:
+                return value
+        # Время попало в клиринг или перерыв — переносим на открытие следующего периода
+        later = [start for start, _ in self.sessions if start > value]
+        return min(later) if later else None
+
+    def session_at(self, moment):
+        """Торговый период, в который попадает момент, или None (клиринг, ночь)."""
+        if not self.is_trading_day(moment.date()):
+            return None
+        for start, end in self.sessions:
+            if start <= moment.time() < end:
+                return start, end
+        return None
+
+    def day_slots(self, day, times=None, interval=None):
+        """Моменты запуска за торговый день: заданное время или каждые interval в сессии."""
+        if not self.is_trading_day(day):
+            return []
+        slots = []
+        if interval:
+            for start, end in self.sessions:
+                moment = datetime.combine(day, start, MOSCOW)
+                while moment.time() < end and moment.date() == day:
+                    slots.append(moment)
+                    moment += interval
+        else:
+            for value in times or []:
+                slot_time = self.slot_time(value)
+                if slot_time is not None:
+                    slots.append(datetime.combine(day, slot_time, MOSCOW))
+        return sorted(set(slots))
+
+
+class AdaptiveScheduler:
+    """Запуск задачи по торговому календарю с объединением пропущенных запусков.
+
+    Последний выполненный слот хранится в state_path, поэтому после перезапуска
+    бот не отправляет тот же дайджест повторно.
+    """
+
+    def __init__(self, task, calendar=None, times=None, interval=None, jitter=30,
+                 grace=DEFAULT_GRACE, state_path="data/scheduler.json"):
+        self.task = task
+        self.calendar = calendar or TradingCalendar()
+        self.times = [_parse_time(value) for value in (times or DEFAULT_TIMES)]
+        self.interval = timedelta(minutes=interval) if interval else None
+        self.jitter = jitter
+        self.grace = grace
+        self.state_path = state_path
+        self.last_slot = self._load_state()
+        if not self.interval:
+            for value in self.times:
+                if self.calendar.slot_time(value) is None:
+                    logging.warning(f"Время рассылки {value:%H:%M} позже всех торговых сессий, запуск пропускается.")
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, "r") as file:
+                return datetime.fromisoformat(json.load(file)["last_slot"])
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.error(f"Ошибка при чтении истории запусков {self.state_path}: {e}")
+            return None
+
+    def _save_state(self):
+        write_atomic(self.state_path, lambda file: json.dump({"last_slot": self.last_slot.isoformat()}, file))
+
+    def _slots_from(self, day, days=30):
+        for offset in range(days):
+            yield from self.calendar.day_slots(day + timedelta(days=offset), self.times, self.interval)
+
+    def next_slot(self, after):
+        """Ближайший слот строго после момента after."""
+        for slot in self._slots_from(after.date()):
+            if slot > after:
+                return slot
+        return None
+
+    def due_slot(self, now):
+        """Последний невыполненный слот в пределах grace (пропущенные объединяются в один)."""
+        since = now - self.grace
+        if self.last_slot and self.last_slot > since:
+            since = self.last_slot
+        due = None
+        for slot in self._slots_from(since.date(), days=(now.date() - since.date()).days + 1):
+            if since < slot <= now:
+                due = slot
+        return due
+
+    async def _run_slot(self, slot):
+        logging.info(f"Запуск задачи по расписанию, слот {slot:%d.%m.%Y %H:%M}")
+        self.last_slot = slot
+        self._save_state()
+        try:
+            await self.task()
+        except Exception as e:
+            logging.error(f"Ошибка при выполнении задачи по расписанию: {e}")
+
+    async def run(self):
+        while True:
+            # Кэш календаря обновляется из ISS, когда устарел (и при первом запуске)
+            if self.calendar.needs_refresh():
+                await asyncio.to_thread(self.calendar.refresh)
+
+            now = datetime.now(MOSCOW)
+            slot = self.due_slot(now)
+            if slot is not None:
+                # Задача выполняется в этом же цикле, поэтому запуски не перекрываются
+                await self._run_slot(slot)
+                continue
+
+            upcoming = self.next_slot(max(now, self.last_slot or now))
+            if upcoming is None:
+                logging.warning("Нет торговых дней в ближайшие 30 дней, повторная проверка через сутки.")
+                await asyncio.sleep(86400)
+                continue
+
+            delay = (upcoming - now).total_seconds() + random.uniform(0, self.jitter)
+            logging.info(f"Следующий запуск по расписанию: {upcoming:%d.%m.%Y %H:%M}")
+            # Спим порциями, чтобы корректно пережить перевод часов и сон машины
+            await asyncio.sleep(min(delay, 3600))
+
+    def start(self):
+        return asyncio.ensure_future(self.run())
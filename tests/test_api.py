@@ -0,0 +1,54 @@
+"""Снимки и история HTTP API (telegram_bot.api.SnapshotStore)."""
+import json
+
+import pytest
+
+from core.snapshot import SpreadRow, TotalRow
+from telegram_bot.api import SnapshotStore
+
+
+def make_snapshot(systime, n=3):
+    total = [TotalRow(SYSTIME=systime, ASSETCODE="SBER", SHORTNAME_futures=f"F{i}", kerry_year=float(i))
+             for i in range(n)]
+    spread = [SpreadRow(System_date=systime, Name_spread="F0-F1", kerry_spread_y=1.5)]
+    return total, spread
+
+
+def history(store, name="total", query=None):
+    return json.loads(store.get(f"history/{name}", query or {}).body)
+
+
+def test_republished_snapshot_replaces_last_history_entry():
+    store = SnapshotStore()
+    store.publish(*make_snapshot("2025-10-01 12:00:00"))
+    store.publish(*make_snapshot("2025-10-01 12:00:00"))
+    assert len(history(store)) == 3
+
+    store.publish(*make_snapshot("2025-10-01 13:00:00"))
+    assert [row["SYSTIME"] for row in history(store)[::3]] == ["2025-10-01 12:00:00", "2025-10-01 13:00:00"]
+
+
+def test_history_is_bounded():
+    store = SnapshotStore(history_size=2)
+    for hour in (10, 11, 12):
+        store.publish(*make_snapshot(f"2025-10-01 {hour}:00:00", n=1))
+    assert [row["SYSTIME"] for row in history(store)] == ["2025-10-01 11:00:00", "2025-10-01 12:00:00"]
+
+
+def test_limit():
+    store = SnapshotStore()
+    for hour in (10, 11, 12):
+        store.publish(*make_snapshot(f"2025-10-01 {hour}:00:00", n=1))
+    assert [row["SYSTIME"] for row in history(store, query={"limit": ["2"]})] == [
+        "2025-10-01 11:00:00", "2025-10-01 12:00:00"
+    ]
+    assert history(store, query={"limit": ["0"]}) == []
+    with pytest.raises(ValueError):
+        history(store, query={"limit": ["-1"]})
+
+
+def test_gzip_variant_has_own_etag():
+    store = SnapshotStore()
+    store.publish(*make_snapshot("2025-10-01 12:00:00"))
+    response = store.get("total", {})
+    assert response.etag_gzip != response.etag
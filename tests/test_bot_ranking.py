@@ -0,0 +1,23 @@
+"""Ранжирование топа по z-оценке (telegram_bot.bot.top_by_score)."""
+import pytest
+
+pytest.importorskip("telegram")
+
+from core.snapshot import SpreadRow  # noqa: E402
+from telegram_bot.bot import top_by_score  # noqa: E402
+
+
+def rows(*values):
+    return [SpreadRow(Name_spread=name, kerry_spread_y=value) for name, value in values]
+
+
+def test_unscored_rows_fill_the_top():
+    data = rows(("A", 1.0), ("B", 2.0), ("NEW1", 30.0), ("NEW2", 20.0), ("NEW3", 10.0), ("NEW4", 5.0))
+    scores = {"A": (2.0, 0.9), "B": (-1.0, 0.2)}
+    top = top_by_score(data, scores, "Name_spread", "kerry_spread_y")
+    assert [row.Name_spread for row in top] == ["A", "B", "NEW1", "NEW2", "NEW3"]
+
+
+def test_without_scores_ranks_by_value():
+    data = rows(("A", 1.0), ("B", 2.0))
+    assert [row.Name_spread for row in top_by_score(data, {}, "Name_spread", "kerry_spread_y")] == ["B", "A"]
@@ -0,0 +1,103 @@
+"""Скользящая статистика кэрри (core.carry_stats)."""
+import json
+import random
+import statistics
+from bisect import bisect_right
+
+import pytest
+
+from core.carry_stats import CarryStats, P2Histogram, Welford
+
+
+def test_welford_matches_statistics():
+    rng = random.Random(1)
+    values = [rng.uniform(-3, 9) for _ in range(500)]
+    moments = Welford()
+    for value in values:
+        moments.update(value)
+    assert moments.count == len(values)
+    assert moments.mean == pytest.approx(statistics.fmean(values))
+    assert moments.std == pytest.approx(statistics.stdev(values))
+
+
+@pytest.mark.parametrize("draw", [
+    lambda rng: rng.gauss(10, 3),
+    lambda rng: rng.uniform(-5, 5),
+    lambda rng: rng.expovariate(0.5),
+])
+def test_p2_percentile_tracks_empirical_distribution(draw):
+    rng = random.Random(42)
+    values = [draw(rng) for _ in range(5000)]
+    sketch = P2Histogram()
+    for value in values:
+        sketch.update(value)
+
+    ordered = sorted(values)
+    for q in (0.05, 0.25, 0.5, 0.75, 0.95):
+        value = ordered[int(q * len(ordered))]
+        assert sketch.percentile(value) == pytest.approx(bisect_right(ordered, value) / len(ordered), abs=0.02)
+    assert sketch.percentile(ordered[0] - 1) == 0.0
+    assert sketch.percentile(ordered[-1]) == 1.0
+
+
+def test_p2_small_samples_are_exact():
+    sketch = P2Histogram(cells=4)
+    for value in (3, 1, 2):
+        sketch.update(value)
+    assert sketch.heights == [1, 2, 3]
+    assert sketch.percentile(2) == 0.5
+
+
+def fill(stats, key, count, start=0):
+    for i in range(start, start + count):
+        stats.observe([(key, float(i % 7))], f"2025-10-01 {i // 60:02d}:{i % 60:02d}:00")
+
+
+def test_repeated_systime_is_neither_scored_nor_counted(tmp_path):
+    stats = CarryStats(path=str(tmp_path / "stats.json"), min_observations=5)
+    fill(stats, "SBER", 10)
+    systime = "2025-10-02 10:00:00"
+
+    first = stats.observe([("SBER", 3.0)], systime)
+    assert first["SBER"][0] is not None
+    count = stats.stats["SBER"].moments.count
+
+    assert stats.observe([("SBER", 3.0)], systime) == {}
+    assert stats.stats["SBER"].moments.count == count
+    assert stats.snapshots == 11
+
+
+def test_unseen_keys_are_pruned(tmp_path):
+    stats = CarryStats(path=str(tmp_path / "stats.json"), max_missed=3)
+    stats.observe([("OLD", 1.0), ("NEW", 1.0)], "2025-10-01 10:00:00")
+    for hour in (11, 12, 13):
+        stats.observe([("NEW", 1.0), ("NAN", float("nan"))], f"2025-10-01 {hour}:00:00")
+    stats.save()
+    assert set(stats.stats) == {"OLD", "NEW"}
+
+    stats.observe([("NEW", 1.0)], "2025-10-01 14:00:00")
+    stats.save()
+    assert set(stats.stats) == {"NEW"}
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = tmp_path / "stats.json"
+    stats = CarryStats(path=str(path), min_observations=5)
+    fill(stats, "SBER", 30)
+    stats.save()
+
+    loaded = CarryStats(path=str(path), min_observations=5).load()
+    assert loaded.snapshots == stats.snapshots
+    assert loaded.score("SBER", 4.0) == stats.score("SBER", 4.0)
+
+
+def test_load_previous_format(tmp_path):
+    path = tmp_path / "stats.json"
+    stats = CarryStats(path=str(path))
+    fill(stats, "SBER", 3)
+    path.write_text(json.dumps({key: stat.to_dict() for key, stat in stats.stats.items()}))
+
+    loaded = CarryStats(path=str(path)).load()
+    assert loaded.stats["SBER"].moments.count == 3
+    loaded.save()
+    assert "SBER" in loaded.stats
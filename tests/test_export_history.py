@@ -0,0 +1,70 @@
+"""Потоковая выгрузка истории (export_history.py)."""
+import sqlite3
+
+import pytest
+
+import export_history
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = tmp_path / "spread.db"
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE spread ("System_date" TEXT, "Name_spread" TEXT, '
+                 '"kerry_spread" INTEGER, "kerry_spread_y" REAL)')
+    conn.executemany(
+        "INSERT INTO spread VALUES (?, ?, ?, ?)",
+        [(f"2025-10-{day:02d} 12:00:00", "A-B" if day % 2 else "A-C", day, day * 1.5) for day in range(1, 11)],
+    )
+    conn.commit()
+    conn.close()
+    return str(path)
+
+
+def args(db, *argv):
+    return export_history.parse_args(["spread", "--db", db, *argv])
+
+
+def test_write_succeeds_while_export_is_running(db):
+    chunks = export_history.iter_db_chunks(args(db, "--chunk-size", "3"))
+    columns, _, total_rows = next(chunks)
+    exported = list(next(chunks))
+
+    # Выгрузка приостановлена после первого чанка — бот всё равно может записать снимок
+    writer = sqlite3.connect(db, timeout=0.1)
+    writer.execute("INSERT INTO spread VALUES ('2025-10-11 12:00:00', 'A-B', 11, 16.5)")
+    writer.commit()
+    writer.close()
+
+    for rows in chunks:
+        exported.extend(rows)
+    assert total_rows == 10
+    assert [row[0][8:10] for row in exported] == [f"{day:02d}" for day in range(1, 11)]
+
+
+def test_filters(db):
+    chunks = export_history.iter_db_chunks(args(db, "--spread", "A-C", "--from", "2025-10-03", "--to", "2025-10-06"))
+    _, _, total_rows = next(chunks)
+    rows = [row for chunk in chunks for row in chunk]
+    assert total_rows == 2
+    assert [row[0][:10] for row in rows] == ["2025-10-04", "2025-10-06"]
+
+
+@pytest.mark.parametrize("argv", [["total", "--spread", "A-B"], ["spread", "--asset", "SBER"]])
+def test_filter_for_other_table_is_rejected(argv):
+    with pytest.raises(SystemExit):
+        export_history.parse_args(argv)
+
+
+def test_parquet_types_follow_stored_values(db, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    conn = sqlite3.connect(db)
+    conn.execute("INSERT INTO spread VALUES ('2025-10-11 12:00:00', 'A-B', 1.5, NULL)")
+    conn.commit()
+    conn.close()
+
+    output = str(tmp_path / "spread.parquet")
+    assert export_history.export(args(db, "-f", "parquet", "-o", output, "--chunk-size", "4")) == 11
+    table = pq.read_table(output)
+    assert str(table.schema.field("kerry_spread").type) == "double"
+    assert table.column("kerry_spread").to_pylist()[-1] == 1.5
@@ -0,0 +1,50 @@
+"""Порядок закэшированных снимков и вывод топов в get_kerry.py."""
+import os
+
+import pytest
+
+from core import snapshot
+from core.pipeline import SnapshotPipeline
+from tests.test_snapshot_parity import FUTURES, SHARES
+
+OLD, NEW = "2025-10-01 12:00:00", "2025-10-01 16:00:00"
+
+
+def store_snapshot(pipeline, systime):
+    raw = {"futures": FUTURES.replace(OLD, systime), "shares": SHARES.replace(OLD, systime)}
+    pipeline._store(systime, "fetch", {"raw": raw})
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    pipeline = SnapshotPipeline(cache_dir=str(tmp_path / "cache"), keep_snapshots=1)
+    store_snapshot(pipeline, OLD)
+    store_snapshot(pipeline, NEW)
+    # Старый снимок перезаписан позже нового (повторный прогон этапов)
+    old_dir = os.path.join(pipeline.cache_dir, pipeline._safe(OLD))
+    os.utime(old_dir, (os.path.getmtime(old_dir) + 60,) * 2)
+    return pipeline
+
+
+def test_latest_systime_by_systime_not_mtime(pipeline):
+    assert pipeline.cached_systimes() == [OLD, NEW]
+    assert pipeline.latest_systime() == NEW
+
+
+def test_prune_keeps_newest_systime(pipeline):
+    pipeline._prune()
+    assert pipeline.cached_systimes() == [NEW]
+
+
+def test_print_top_positions_without_spreads():
+    pytest.importorskip("pandas")
+    from get_kerry import print_top_positions
+
+    # Один контракт на актив — спредов нет, облегчённый режим отдаёт пустой список
+    lines = [line for line in FUTURES.splitlines() if not line.startswith(("SR", "GZ")) and ";SR" not in line
+             and ";GZ" not in line]
+    futures = snapshot.parse_futures("\n".join(lines))
+    total = snapshot.compute_total(futures, snapshot.parse_shares(SHARES))
+    spread = snapshot.compute_spread(total)
+    assert total and spread == []
+    print_top_positions({"total": total, "spread": spread})
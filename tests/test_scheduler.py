@@ -0,0 +1,123 @@
+"""Торговый календарь и расписание (telegram_bot.scheduler)."""
+import json
+import logging
+from datetime import date, datetime, time, timedelta
+from unittest import mock
+
+import pytest
+
+from telegram_bot import scheduler
+from telegram_bot.scheduler import MOSCOW, AdaptiveScheduler, TradingCalendar
+
+
+def moscow(value):
+    return datetime.fromisoformat(value).replace(tzinfo=MOSCOW)
+
+
+@pytest.fixture
+def calendar(tmp_path):
+    # 2025-10-06 (понедельник) — праздник, 2025-10-11 (суббота) — торговый день
+    path = tmp_path / "calendar.json"
+    path.write_text(json.dumps({"holidays": ["2025-10-06"], "workdays": ["2025-10-11"]}))
+    return TradingCalendar(path=str(path))
+
+
+def make_scheduler(calendar, tmp_path, **kwargs):
+    return AdaptiveScheduler(None, calendar=calendar, state_path=str(tmp_path / "scheduler.json"), **kwargs)
+
+
+def test_trading_days(calendar):
+    assert calendar.is_trading_day(date(2025, 10, 3))  # пятница
+    assert not calendar.is_trading_day(date(2025, 10, 4))  # суббота
+    assert not calendar.is_trading_day(date(2025, 10, 6))  # праздник
+    assert calendar.is_trading_day(date(2025, 10, 11))  # торговая суббота
+
+
+def test_day_slots_shift_clearing_breaks(calendar):
+    times = [time(11, 34), time(14, 2), time(18, 45)]
+    assert calendar.day_slots(date(2025, 10, 3), times) == [
+        moscow("2025-10-03 11:34"), moscow("2025-10-03 14:05"), moscow("2025-10-03 19:05")
+    ]
+    assert calendar.day_slots(date(2025, 10, 4), times) == []
+    assert calendar.day_slots(date(2025, 10, 11), times)[0] == moscow("2025-10-11 11:34")
+
+
+def test_day_slots_interval_stays_inside_sessions(calendar):
+    slots = calendar.day_slots(date(2025, 10, 3), interval=timedelta(hours=2))
+    assert [slot.strftime("%H:%M") for slot in slots] == [
+        "10:00", "12:00", "14:05", "16:05", "18:05", "19:05", "21:05", "23:05"
+    ]
+
+
+def test_time_after_last_session_is_dropped_with_warning(calendar, tmp_path, caplog):
+    with caplog.at_level(logging.WARNING):
+        make_scheduler(calendar, tmp_path, times=["11:34", "23:55"])
+    assert "23:55" in caplog.text
+    assert calendar.day_slots(date(2025, 10, 3), [time(23, 55)]) == []
+
+
+def test_next_slot_skips_weekend_and_holiday(calendar, tmp_path):
+    schedule = make_scheduler(calendar, tmp_path)
+    assert schedule.next_slot(moscow("2025-10-03 23:40")) == moscow("2025-10-07 11:34")
+    assert schedule.next_slot(moscow("2025-10-10 23:40")) == moscow("2025-10-11 11:34")
+
+
+def test_due_slot_coalesces_missed_slots(calendar, tmp_path):
+    schedule = make_scheduler(calendar, tmp_path, interval=10)
+    # Пропущены 10:00, 10:10 и 10:20 — выполняется только последний
+    assert schedule.due_slot(moscow("2025-10-03 10:25")) == moscow("2025-10-03 10:20")
+
+    schedule.last_slot = moscow("2025-10-03 10:20")
+    assert schedule.due_slot(moscow("2025-10-03 10:25")) is None
+    # Слоты старше grace не выполняются
+    schedule.last_slot = None
+    assert schedule.due_slot(moscow("2025-10-03 11:15")) == moscow("2025-10-03 11:10")
+    assert make_scheduler(calendar, tmp_path, times=["10:00"]).due_slot(moscow("2025-10-03 11:15")) is None
+
+
+class Response:
+    status_code = 200
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+def page(rows, index, total, pagesize=2):
+    return Response({
+        "off_days": {"columns": ["tradedate", "stock_workday", "futures_workday"], "data": rows},
+        "off_days.cursor": {"columns": ["INDEX", "TOTAL", "PAGESIZE"], "data": [[index, total, pagesize]]},
+    })
+
+
+def test_fetch_trading_days_follows_cursor():
+    pages = [
+        page([["2025-10-03", 1, 1], ["2025-10-04", 0, 0]], 0, 3),
+        page([["2025-10-06", 1, 0]], 2, 3),
+    ]
+    with mock.patch.object(scheduler.requests, "get", side_effect=pages) as get:
+        days = scheduler.fetch_trading_days(date(2025, 10, 3), date(2025, 10, 6))
+    assert days == {date(2025, 10, 3): True, date(2025, 10, 4): False, date(2025, 10, 6): False}
+    assert "start=2" in get.call_args_list[1][0][0]
+
+
+def test_refresh_writes_cache(tmp_path):
+    calendar = TradingCalendar(path=str(tmp_path / "calendar.json"))
+    days = {date(2025, 10, 6): False, date(2025, 10, 11): True, date(2025, 10, 12): False}
+    with mock.patch.object(scheduler, "fetch_trading_days", return_value=days):
+        assert calendar.refresh()
+    assert calendar.holidays == {date(2025, 10, 6)}
+    assert calendar.workdays == {date(2025, 10, 11)}
+    assert not calendar.needs_refresh()
+
+
+def test_failed_refresh_backs_off(tmp_path):
+    calendar = TradingCalendar(path=str(tmp_path / "calendar.json"))
+    with mock.patch.object(scheduler, "fetch_trading_days", side_effect=ConnectionError("нет сети")) as fetch:
+        assert not calendar.refresh()
+        assert not calendar.needs_refresh()
+        assert not calendar.refresh()
+    assert fetch.call_count == 1
+    assert calendar.is_stale()
@@ -0,0 +1,75 @@
+"""Облегчённый расчёт снимка (core.snapshot) даёт тот же результат, что и pandas (core.data_processor)."""
+import logging
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from core import data_loader, data_processor, snapshot  # noqa: E402
+
+FUTURES = """securities
+SECID;SHORTNAME;LASTDELDATE;SECTYPE;ASSETCODE;PREVOPENPOSITION;LOTVOLUME;INITIALMARGIN
+SRZ5;SBRF-12.25;2025-12-19;SR;SBRF;100;100;5000.5
+SRH6;SBRF-3.26;2026-03-20;SR;SBRF;100;100;5100.5
+SRM6;SBRF-6.26;2026-06-19;SR;SBRF;100;100;5200.5
+GZZ5;GAZR-12.25;2025-12-19;GZ;GAZR;100;100;2500.5
+GZH6;GAZR-3.26;2026-03-20;GZ;GAZR;100;100;2600.5
+LKZ5;LKOH-12.25;2025-12-19;LK;LKOH;100;10;9000.5
+
+marketdata
+SYSTIME;SECID;SPREAD;LAST;OPENPOSITION;NUMTRADES;TIME
+2025-10-01 12:00:00;SRZ5;1;31500;10;5;11:59:58
+2025-10-01 12:00:00;SRH6;1;32345;10;5;11:59:58
+2025-10-01 12:00:00;SRM6;1;33120;10;5;11:59:58
+2025-10-01 12:00:00;GZZ5;1;13050;10;5;11:59:58
+2025-10-01 12:00:00;GZH6;1;0;10;5;11:59:58
+2025-10-01 12:00:00;LKZ5;1;70110;10;5;11:59:58
+"""
+
+SHARES = """securities
+SECID;SHORTNAME;LOTSIZE
+SBER;Сбербанк;10
+GAZP;ГАЗПРОМ ао;10
+LKOH;ЛУКОЙЛ;1
+
+marketdata
+SECID;BID;OFFER;SPREAD;LAST;TIME;SYSTIME
+SBER;307.1;307.2;0.1;307.15;11:59:59;2025-10-01 12:00:00
+GAZP;127.5;127.6;0.1;127.55;11:59:59;2025-10-01 12:00:00
+LKOH;6925;6926;1;6925.5;11:59:59;2025-10-01 12:00:00
+"""
+
+
+@pytest.fixture
+def snapshots():
+    light_futures, light_shares = snapshot.parse_futures(FUTURES), snapshot.parse_shares(SHARES)
+    pandas_futures, pandas_shares = data_loader.parse_futures_data(FUTURES), data_loader.parse_shares_data(SHARES)
+    light_total = snapshot.compute_total(light_futures, light_shares)
+    pandas_total = data_processor.compute_total(pandas_futures, pandas_shares)
+    return light_total, pandas_total
+
+
+def test_total_matches_pandas(snapshots):
+    light_total, pandas_total = snapshots
+    pd.testing.assert_frame_equal(
+        snapshot.to_dataframe(light_total), pandas_total[list(snapshot.TotalRow.__slots__)]
+    )
+
+
+def test_spread_matches_pandas(snapshots, caplog):
+    light_total, pandas_total = snapshots
+    with caplog.at_level(logging.WARNING):
+        light_spread = snapshot.compute_spread(light_total)
+        pandas_spread = data_processor.compute_spread(pandas_total)
+    pd.testing.assert_frame_equal(snapshot.to_dataframe(light_spread), pandas_spread)
+
+
+def test_top_positions_match_pandas(snapshots):
+    light_total, pandas_total = snapshots
+    light_top = [row.SHORTNAME_futures for row in snapshot.nlargest(light_total, 5, "kerry_year")]
+    assert light_top == pandas_total.nlargest(5, "kerry_year")["SHORTNAME_futures"].tolist()
+
+
+def test_integer_prices_stay_integer(snapshots):
+    light_total, _ = snapshots
+    assert all(type(row.LAST_futures) is int for row in light_total)